@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Web API for the Medical 3D Pipeline
+Queues MedicalTo3D conversions on a worker pool, streams their progress as
+server-sent events and serves the resulting models (and the viewer) with
+ETags, compression and byte ranges
+"""
+
+import gzip
+import os
+import tempfile
+
+from flask import Flask, Response, abort, jsonify, request, send_file, stream_with_context, url_for
+from flask_cors import CORS
+from werkzeug.utils import safe_join
+
+from batch_process import load_recipe
+from job_manager import JobManager, format_sse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+VIEWER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "medical_viewer.html")
+
+MODEL_TYPES = {
+    ".glb": "model/gltf-binary",
+    ".gltf": "model/gltf+json",
+    ".bin": "application/octet-stream",
+    ".json": "application/json",
+    ".stl": "model/stl",
+}
+
+# Encodings in order of preference: suffix of the cached copy, compressor
+ENCODINGS = [("br", ".br", brotli.compress if brotli else None), ("gzip", ".gz", gzip.compress)]
+
+# Job outputs never change under the same job id; other files may be regenerated
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def compressed_copy(path, suffix, compress):
+    """Path of a compressed copy of path, (re)written when missing or stale"""
+    target = path + suffix
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        with open(path, 'rb') as f:
+            data = compress(f.read())
+        # A temporary per call: concurrent requests (threaded server) each write
+        # a whole copy, and whichever replaces the target last wins
+        descriptor, temporary = tempfile.mkstemp(suffix=".tmp", prefix=os.path.basename(target) + ".",
+                                                 dir=os.path.dirname(target))
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(data)
+            os.chmod(temporary, os.stat(path).st_mode & 0o777)
+            os.replace(temporary, target)
+        except BaseException:
+            os.remove(temporary)
+            raise
+    return target
+
+def create_app(data_root="sample_data", output_root="outputs", executor=None, workers=None):
+    """Flask app serving the viewer, model files and the conversion job API
+
+    Studies are referenced by path relative to data_root (a NRRD file or a
+    DICOM folder). Job outputs go to output_root/jobs/<job id>/.
+    """
+    app = Flask(__name__)
+    CORS(app, expose_headers=["ETag", "Content-Range", "Content-Encoding"])
+    jobs = JobManager(output_root, executor, workers).start_thread()
+    app.config["JOB_MANAGER"] = jobs
+    
+    @app.get("/")
+    def viewer():
+        return send_file(VIEWER_PATH, conditional=True)
+    
+    @app.get("/outputs/<path:filename>")
+    def model(filename):
+        path = safe_join(os.path.abspath(output_root), filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        
+        mimetype = MODEL_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+        served, encoding = path, None
+        # Byte ranges are served from the identity encoding so offsets match the file
+        if "Range" not in request.headers:
+            for name, suffix, compress in ENCODINGS:
+                if compress is not None and name in request.accept_encodings:
+                    served, encoding = compressed_copy(path, suffix, compress), name
+                    break
+        
+        response = send_file(served, mimetype=mimetype, conditional=True, etag=True)
+        response.vary.add("Accept-Encoding")
+        if encoding:
+            response.content_encoding = encoding
+        if filename.startswith("jobs/"):
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+    
+    @app.post("/api/jobs")
+    def submit_job():
+        body = request.get_json(silent=True) or {}
+        study = body.get("study")
+        if not isinstance(study, str) or not study:
+            return jsonify(error="'study' (a path under the data root) is required"), 400
+        
+        study_path = safe_join(os.path.abspath(data_root), study)
+        if study_path is None or not os.path.exists(study_path):
+            return jsonify(error=f"Study not found: {study}"), 404
+        
+        try:
+            recipe = load_recipe(overrides=body.get("recipe"))
+        except (TypeError, ValueError) as e:
+            return jsonify(error=str(e)), 400
+        
+        job = jobs.call(jobs.submit(study_path, recipe, study))
+        return jsonify(job_response(job.id)), 202
+    
+    @app.get("/api/jobs/<job>")
+    def job_status(job):
+        if jobs.status(job) is None:
+            abort(404)
+        return jsonify(job_response(job))
+    
+    @app.get("/api/jobs/<job>/events")
+    def job_events(job):
+        """Server-sent "status" and "progress" events until the job finishes"""
+        if jobs.status(job) is None:
+            abort(404)
+        
+        def stream():
+            events = jobs.subscribe(job)
+            try:
+                while True:
+                    try:
+                        event = jobs.call(anext(events))
+                    except StopAsyncIteration:
+                        return
+                    if event["type"] == "status":
+                        event = dict(job_response(job, event), type="status")
+                    yield format_sse(event)
+            finally:
+                # Also runs when the client disconnects mid-stream
+                jobs.call(events.aclose())
+        
+        response = Response(stream_with_context(stream()), mimetype="text/event-stream")
+        response.cache_control.no_cache = True
+        # Keep reverse proxies from buffering the stream
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+    
+    def job_response(job, status=None):
+        status = status or jobs.status(job)
+        response = {key: status[key] for key in ("id", "study", "status") if key in status}
+        response["url"] = url_for("job_status", job=job)
+        response["events"] = url_for("job_events", job=job)
+        if "error" in status:
+            response["error"] = status["error"]
+        if "result" in status:
+            prefix = f"jobs/{job}/"
+            response["models"] = [url_for("model", filename=prefix + path) for path in status["result"]["outputs"]]
+            response["timings"] = status["result"]["timings"]
+        return response
+    
+    return app
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve the viewer and the conversion API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--data-root", default="sample_data")
+    parser.add_argument("--output-root", default="outputs")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    
+    app = create_app(args.data_root, args.output_root, workers=args.workers)
+    print(f"🌐 Serving on http://{args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Batch conversion of a directory of studies
+Runs one recipe over every study in a bounded pool of worker processes,
+skipping studies that already finished so an interrupted batch can resume
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from med_pipeline import DEFAULT_SURFACE_METHOD, MedicalTo3D
+
+DEFAULT_RECIPE = {
+    "window": [-1000, 4000],
+    "native_hu": False,
+    # Isotropic resampling before segmenting: target spacing in mm and/or a voxel budget
+    "spacing": None,
+    "max_voxels": None,
+    "threshold": [0.4, 1.0],
+    "hu": False,
+    "keep": 1,
+    "min_volume": 0.0,
+    # [name, lower, upper, color] rows; when set, one GLB per tissue replaces "outputs"
+    "tissues": None,
+    "smoothing_iterations": 15,
+    "method": DEFAULT_SURFACE_METHOD,
+    "outputs": ["glb"],
+    "quantize": False,
+    "color": [0.9, 0.9, 0.8],
+}
+
+# "volume" is a bricked texture pyramid of the image for ray marching (no mesh)
+OUTPUT_FORMATS = ("glb", "gltf", "stl", "lods", "volume")
+VOLUME_EXTENSIONS = (".nrrd", ".nhdr")
+DONE_MARKER = "done.json"
+MAX_ATTEMPTS = 2
+
+def find_studies(input_dir):
+    """Studies in input_dir: NRRD files and DICOM folders, by name"""
+    studies = {}
+    for name in sorted(os.listdir(input_dir)):
+        path = os.path.join(input_dir, name)
+        if name.startswith('.'):
+            continue
+        if os.path.isdir(path):
+            studies[name] = path
+        elif name.lower().endswith(VOLUME_EXTENSIONS):
+            studies[os.path.splitext(name)[0]] = path
+    return studies
+
+def load_recipe(recipe_path=None, overrides=None):
+    """DEFAULT_RECIPE updated from a JSON file and/or a dict, validated"""
+    recipe = dict(DEFAULT_RECIPE)
+    if recipe_path:
+        with open(recipe_path) as f:
+            recipe.update(json.load(f))
+    recipe.update(overrides or {})
+    
+    unknown = set(recipe) - set(DEFAULT_RECIPE)
+    if unknown:
+        raise ValueError(f"Unknown recipe keys {sorted(unknown)}")
+    unknown = set(recipe["outputs"]) - set(OUTPUT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown outputs {sorted(unknown)}; expected some of {OUTPUT_FORMATS}")
+    return recipe
+
+def limit_memory(max_bytes):
+    """Worker initializer: cap the address space so a runaway study fails alone"""
+    if max_bytes:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+
+def process_study(name, path, output_dir, recipe, cache_dir=None, progress=None):
+    """Run the recipe on one study; returns its stage timings and output files
+
+    progress, if given, is called with each of the pipeline's progress events.
+    """
+    study_dir = os.path.join(output_dir, name)
+    os.makedirs(study_dir, exist_ok=True)
+    
+    pipeline = MedicalTo3D(cache_dir=cache_dir)
+    if progress is not None:
+        pipeline.profiler.listeners.append(progress)
+    if os.path.isdir(path):
+        pipeline.load_dicom_series(path)
+    else:
+        pipeline.load_nrrd(path)
+    pipeline.preprocess_ct(*recipe["window"], native_hu=recipe["native_hu"])
+    if recipe["spacing"] or recipe["max_voxels"]:
+        pipeline.resample(recipe["spacing"], recipe["max_voxels"])
+    
+    outputs = []
+    if recipe["tissues"]:
+        pipeline.segment_labels([tuple(tissue) for tissue in recipe["tissues"]], hu=recipe["hu"])
+        pipeline.generate_label_meshes(recipe["smoothing_iterations"])
+        exported = pipeline.export_label_meshes(os.path.join(study_dir, "{name}.glb"), quantize=recipe["quantize"])
+        outputs.extend(exported.values())
+    else:
+        if "volume" in recipe["outputs"]:
+            outputs.append(pipeline.export_volume_bricks(os.path.join(study_dir, f"{name}_volume")))
+        mesh_outputs = [output for output in recipe["outputs"] if output != "volume"]
+        if mesh_outputs:
+            pipeline.segment_threshold(*recipe["threshold"], hu=recipe["hu"], keep=recipe["keep"],
+                                       min_volume=recipe["min_volume"])
+            pipeline.generate_mesh(recipe["smoothing_iterations"], method=recipe["method"])
+        
+        for output in mesh_outputs:
+            output_path = os.path.join(study_dir, f"{name}.{'glb' if output == 'lods' else output}")
+            if output == "stl":
+                pipeline.export_stl(output_path)
+            elif output == "lods":
+                output_path = pipeline.export_lods(output_path, color=recipe["color"], quantize=recipe["quantize"])
+            else:
+                pipeline.export_gltf(output_path, color=recipe["color"], quantize=recipe["quantize"])
+            outputs.append(output_path)
+    
+    timings = pipeline.profiler.totals()
+    pipeline.profiler.save_report(os.path.join(study_dir, "profile.json"))
+    result = {"study": name, "timings": timings, "seconds": sum(timings.values()),
+              "outputs": [os.path.relpath(path, output_dir) for path in outputs]}
+    
+    # Written last: its presence is what marks the study as done
+    with open(os.path.join(study_dir, DONE_MARKER), 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+def run_pool(task, jobs, workers=None, memory_limit=None):
+    """Run task(*args) for each name -> args in jobs on a fresh worker pool
+
+    Yields (name, result or exception) as they finish. Workers are spawned
+    and run one task each, so memory never accumulates across studies.
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=limit_memory, initargs=(memory_limit,),
+                             max_tasks_per_child=1) as executor:
+        futures = {executor.submit(task, *args): name for name, args in jobs.items()}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+def run_batch(input_dir, output_dir, recipe, workers=None, memory_limit=None, cache_dir=None,
+              task=process_study):
+    """Process every study not yet done; returns the batch summary (also saved as JSON)
+
+    task (process_study by default) runs one study in a worker process.
+    """
+    studies = find_studies(input_dir)
+    pending = [name for name in studies
+               if not os.path.exists(os.path.join(output_dir, name, DONE_MARKER))]
+    skipped = len(studies) - len(pending)
+    print(f"📦 {len(studies)} studies, {skipped} already done, {len(pending)} to process")
+    
+    results, failures = [], {}
+    attempts = dict.fromkeys(pending, 0)
+    suspects = []
+    start = time.perf_counter()
+    
+    # A crashed worker breaks the whole pool, failing every unfinished study with
+    # it. Those are requeued as suspects and rerun one per pool, where a crash can
+    # only be the study's own and is the only thing that uses up its attempts.
+    while pending or suspects:
+        isolated = not pending
+        names = [suspects.pop(0)] if isolated else pending
+        pending = []
+        jobs = {name: (name, studies[name], output_dir, recipe, cache_dir) for name in names}
+        for name, outcome in run_pool(task, jobs, 1 if isolated else workers, memory_limit):
+            if isinstance(outcome, BrokenProcessPool):
+                if not isolated:
+                    suspects.append(name)
+                    continue
+                attempts[name] += 1
+                if attempts[name] < MAX_ATTEMPTS:
+                    suspects.append(name)
+                else:
+                    failures[name] = "worker process crashed"
+                    print(f"❌ {name}: worker process crashed")
+            elif isinstance(outcome, Exception):
+                failures[name] = f"{type(outcome).__name__}: {outcome}"
+                print(f"❌ {name}: {failures[name]}")
+            else:
+                results.append(outcome)
+                print(f"✅ {name}: {outcome['seconds']:.1f}s")
+    
+    summary = summarize(results, failures, skipped, time.perf_counter() - start)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "batch_summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print_summary(summary)
+    return summary
+
+def summarize(results, failures, skipped, wall_seconds):
+    stages = {}
+    for result in results:
+        for stage, seconds in result["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+    
+    return {
+        "processed": len(results),
+        "skipped": skipped,
+        "failed": failures,
+        "wall_seconds": wall_seconds,
+        "studies_per_hour": len(results) * 3600 / wall_seconds if results else 0.0,
+        "stages": {stage: {"total": sum(times), "mean": sum(times) / len(times), "max": max(times)}
+                   for stage, times in stages.items()},
+    }
+
+def print_summary(summary):
+    print(f"\n📊 Batch summary: {summary['processed']} processed, {summary['skipped']} skipped, "
+          f"{len(summary['failed'])} failed in {summary['wall_seconds']:.1f}s "
+          f"({summary['studies_per_hour']:.1f} studies/hour)")
+    for stage, stats in summary["stages"].items():
+        print(f"   {stage:<10} mean {stats['mean']:7.2f}s  max {stats['max']:7.2f}s  total {stats['total']:8.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a directory of studies with one recipe")
+    parser.add_argument("input_dir", help="directory of NRRD files and/or DICOM study folders")
+    parser.add_argument("output_dir", help="one subfolder per study is written here")
+    parser.add_argument("--recipe", help="JSON file overriding the default recipe")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--memory-limit-gb", type=float, default=None, help="address-space limit per worker")
+    parser.add_argument("--cache-dir", default=None, help="stage cache shared by the workers")
+    args = parser.parse_args()
+    
+    memory_limit = int(args.memory_limit_gb * 1024 ** 3) if args.memory_limit_gb else None
+    summary = run_batch(args.input_dir, args.output_dir, load_recipe(args.recipe),
+                        args.workers, memory_limit, args.cache_dir)
+    return 1 if summary["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark every pipeline stage on synthetic CT phantoms
+Builds sphere, shell and thin-tube phantoms in HU at several sizes and times
+preprocessing, segmentation, component selection, meshing, STL/glTF export
+and STL → glTF conversion, with voxel/triangle throughput and peak RSS.
+Each phantom size runs in a fresh process so peak RSS is measured independently.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import tempfile
+import time
+import numpy as np
+import SimpleITK as sitk
+
+from med_pipeline import MedicalTo3D
+from profiling import log, peak_rss_mb
+from stl_to_gltf import stl_to_gltf
+
+PHANTOMS = ("spheres", "shells", "tubes")
+DEFAULT_SIZES = (64, 128, 192)
+# Longest a phantom run may take before its worker is killed
+DEFAULT_TIMEOUT = 3600
+# Structures are bone-dense; tubes are contrast-filled vessels
+PHANTOM_HU = {"spheres": 1000, "shells": 1000, "tubes": 400}
+BODY_HU = 40
+AIR_HU = -1000
+
+def make_phantom(kind="spheres", size=128, spacing=(0.8, 0.8, 1.0), noise=20.0, seed=0):
+    """size³ CT phantom in HU (int16): structures inside a noisy soft-tissue body
+
+    spheres: balls of several radii (many components, one largest)
+    shells:  nested hollow spherical shells a few voxels thick
+    tubes:   thin straight vessels, 1-2 voxels in radius, crossing the body
+    Built slice by slice so the phantom itself does not set the peak RSS.
+    """
+    if kind not in PHANTOMS:
+        raise ValueError(f"Unknown phantom {kind!r}, expected one of {PHANTOMS}")
+    rng = np.random.default_rng(seed)
+    # Structure coordinates in voxels; the layout scales with size
+    scale = size / 128
+    if kind == "spheres":
+        centers = rng.uniform(0.25, 0.75, (12, 3)) * size
+        radii = np.r_[24, rng.uniform(3, 12, 11)] * scale
+    elif kind == "shells":
+        radii = np.array([48, 36, 24, 12]) * scale
+        thickness = max(2.0, 3 * scale)
+    else:
+        starts = rng.uniform(0.2, 0.8, (16, 3)) * size
+        directions = rng.normal(size=(16, 3))
+        directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+        radii = rng.uniform(1.0, 2.0, 16)
+    
+    y, x = np.mgrid[:size, :size].astype(np.float32)
+    center = (size - 1) / 2
+    body = (x - center) ** 2 + (y - center) ** 2 < (0.45 * size) ** 2
+    array = np.empty((size, size, size), dtype=np.int16)
+    for z in range(size):
+        structure = np.zeros((size, size), dtype=bool)
+        if kind == "spheres":
+            for (cx, cy, cz), radius in zip(centers, radii):
+                structure |= (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2 < radius ** 2
+        elif kind == "shells":
+            distance = np.sqrt((x - center) ** 2 + (y - center) ** 2 + (z - center) ** 2)
+            for radius in radii:
+                structure |= np.abs(distance - radius) < thickness / 2
+        else:
+            for start, direction, radius in zip(starts, directions, radii):
+                offset = np.stack([x - start[0], y - start[1], np.full_like(x, z - start[2])], axis=-1)
+                # Distance from each voxel to the tube's axis
+                along = offset @ direction
+                structure |= np.sum(offset ** 2, axis=-1) - along ** 2 < radius ** 2
+        
+        array[z] = np.where(body, rng.normal(BODY_HU, noise, (size, size)), AIR_HU)
+        array[z][structure & body] = PHANTOM_HU[kind]
+    
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing(spacing)
+    return image
+
+def stage_result(record, voxels=None, triangles=None):
+    """Seconds, throughput and peak RSS for one profiler record
+
+    peak_rss_mb is the stage's own peak (None off Linux); process_peak_rss_mb
+    the process high-water mark when the stage ended.
+    """
+    seconds = record["wall"]
+    peak = record["peak_rss_mb"]
+    result = {
+        "seconds": round(seconds, 4),
+        "peak_rss_mb": None if peak is None else round(peak, 1),
+        "process_peak_rss_mb": round(record["process_peak_rss_mb"] or 0.0, 1),
+    }
+    if voxels:
+        result["voxels"] = voxels
+        result["voxels_per_s"] = round(voxels / max(seconds, 1e-9))
+    if triangles:
+        result["triangles"] = triangles
+        result["triangles_per_s"] = round(triangles / max(seconds, 1e-9))
+    return result
+
+def run_phantom(kind, size, smoothing_iterations, results):
+    """Every stage on one phantom; posts the result (or the error) to the results queue"""
+    log.setLevel(logging.WARNING)
+    try:
+        results.put(bench_phantom(kind, size, smoothing_iterations))
+    except Exception as e:
+        results.put({"phantom": kind, "size": size, "error": f"{type(e).__name__}: {e}"})
+
+def bench_phantom(kind, size, smoothing_iterations=20):
+    """Run and time every stage on one phantom in this process"""
+    image = make_phantom(kind, size)
+    baseline = peak_rss_mb() or 0.0
+    voxels = image.GetNumberOfPixels()
+    
+    pipeline = MedicalTo3D()
+    pipeline.image = image
+    pipeline.preprocess_ct(native_hu=True)
+    pipeline.segment_threshold(PHANTOM_HU[kind] / 2, 3000, hu=True)
+    mesh = pipeline.generate_mesh(smoothing_iterations)
+    triangles = mesh.GetNumberOfCells()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        stl_path = pipeline.export_stl(os.path.join(tmp, "phantom.stl"))
+        pipeline.export_gltf(os.path.join(tmp, "phantom.glb"))
+        with pipeline.profiler.stage("stl_to_gltf"):
+            stl_to_gltf(stl_path, os.path.join(tmp, "converted.glb"))
+    
+    records = {}
+    for record in pipeline.profiler.records:
+        # Latest record per name; component selection is a step of segment_threshold
+        if record["depth"] == 0 or record["name"] == "connected components":
+            records[record["name"]] = record
+    
+    stages = {
+        "preprocess_ct": stage_result(records["preprocess_ct"], voxels=voxels),
+        "segment_threshold": stage_result(records["segment_threshold"], voxels=voxels),
+        "_keep_largest_components": stage_result(records["connected components"], voxels=voxels),
+        "generate_mesh": stage_result(records["generate_mesh"], voxels=pipeline.segmentation.GetNumberOfPixels(),
+                                      triangles=triangles),
+        "export_stl": stage_result(records["export_stl"], triangles=triangles),
+        "export_gltf": stage_result(records["export_gltf"], triangles=triangles),
+        "stl_to_gltf": stage_result(records["stl_to_gltf"], triangles=triangles),
+    }
+    return {
+        "phantom": kind,
+        "size": size,
+        "voxels": voxels,
+        "segmented_voxels": int(sitk.GetArrayViewFromImage(pipeline.segmentation).sum()),
+        "triangles": triangles,
+        "seconds": round(sum(stage["seconds"] for name, stage in stages.items()
+                             if name != "_keep_largest_components"), 4),
+        "peak_rss_mb": round(peak_rss_mb() or 0.0, 1),
+        "pipeline_rss_mb": round((peak_rss_mb() or 0.0) - baseline, 1),
+        "stages": stages,
+    }
+
+def run_isolated(context, kind, size, smoothing_iterations, timeout=DEFAULT_TIMEOUT, target=run_phantom):
+    """target (run_phantom) in a fresh process; an error entry if it dies (OOM kill, segfault) or times out"""
+    results = context.Queue()
+    process = context.Process(target=target, args=(kind, size, smoothing_iterations, results))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return results.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            if not process.is_alive():
+                # Drain a result posted just before exiting
+                try:
+                    return results.get(timeout=1.0)
+                except queue.Empty:
+                    return {"phantom": kind, "size": size,
+                            "error": f"worker process died (exit code {process.exitcode})"}
+            if time.monotonic() > deadline:
+                return {"phantom": kind, "size": size, "error": f"timed out after {timeout}s"}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+def benchmark(sizes=DEFAULT_SIZES, phantoms=PHANTOMS, smoothing_iterations=20, timeout=DEFAULT_TIMEOUT):
+    """Results for every phantom at every size, each run in a fresh process"""
+    context = multiprocessing.get_context("spawn")
+    results = [run_isolated(context, kind, size, smoothing_iterations, timeout)
+               for kind in phantoms for size in sizes]
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count()},
+        "smoothing_iterations": smoothing_iterations,
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic CT phantoms")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="phantom edge lengths in voxels")
+    parser.add_argument("--phantoms", nargs="+", choices=PHANTOMS, default=list(PHANTOMS))
+    parser.add_argument("--smoothing-iterations", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds allowed per phantom run")
+    parser.add_argument("--output", default="bench_pipeline.json", help="JSON results, to compare across runs")
+    args = parser.parse_args()
+    
+    print(f"⏱️  Benchmarking the pipeline on {', '.join(args.phantoms)} at {args.sizes} voxels per edge...")
+    report = benchmark(args.sizes, args.phantoms, args.smoothing_iterations, args.timeout)
+    for result in report["results"]:
+        if "error" in result:
+            print(f"   ❌ {result['phantom']} {result['size']}³: {result['error']}")
+            continue
+        print(f"   🧊 {result['phantom']} {result['size']}³: {result['seconds']:.2f}s, "
+              f"{result['triangles']:,} triangles, peak RSS {result['peak_rss_mb']:.0f} MB")
+        for name, stage in result["stages"].items():
+            rate = (f"{stage['triangles_per_s'] / 1e6:.2f} Mtriangles/s" if "triangles_per_s" in stage else
+                    f"{stage['voxels_per_s'] / 1e6:.1f} Mvoxels/s")
+            peak = f", peak {stage['peak_rss_mb']:.0f} MB" if stage["peak_rss_mb"] is not None else ""
+            print(f"      {name:>24}: {stage['seconds']:.3f}s ({rate}{peak})")
+    
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results saved to {args.output}")
+    return 0 if all("error" not in result for result in report["results"]) else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
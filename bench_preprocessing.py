@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark float32-window vs native-HU (int16) vs out-of-core preprocessing
+and segmentation
+Each path runs in a fresh process so peak RSS is measured independently
+"""
+
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import numpy as np
+import SimpleITK as sitk
+
+from med_pipeline import MedicalTo3D
+
+def make_noisy_ct(shape=(200, 256, 256), seed=0):
+    """Head-like CT in HU: noisy soft tissue inside a bone shell, air outside
+
+    Built slice by slice so the phantom itself does not set the peak RSS.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.ogrid[:shape[1], :shape[2]]
+    center = np.array(shape) / 2
+    in_plane = ((y - center[1]) / center[1]) ** 2 + ((x - center[2]) / center[2]) ** 2
+    
+    array = np.empty(shape, dtype=np.int16)
+    for z in range(shape[0]):
+        radius = np.sqrt(in_plane + ((z - center[0]) / center[0]) ** 2)
+        array[z] = rng.normal(40, 20, shape[1:])
+        array[z][radius > 0.8] = 900
+        array[z][radius > 0.9] = -1000
+    
+    return sitk.GetImageFromArray(array)
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 if sys.platform != "darwin" else peak / (1024 * 1024)
+
+def run_path(native_hu, shape, queue):
+    image = make_noisy_ct(shape)
+    baseline = peak_rss_mb()
+    
+    pipeline = MedicalTo3D()
+    pipeline.image = image
+    start = time.perf_counter()
+    pipeline.preprocess_ct(window_min=-1000, window_max=4000, native_hu=native_hu)
+    pipeline.segment_threshold(0.3, 1.0)
+    elapsed = time.perf_counter() - start
+    
+    queue.put({
+        "path": "native HU int16" if native_hu else "float32 window",
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "pipeline_rss_mb": round(peak_rss_mb() - baseline, 1),
+        "segmented_voxels": int(sitk.GetArrayViewFromImage(pipeline.segmentation).sum()),
+    })
+
+def run_streaming(nrrd_path, slab_size, queue):
+    baseline = peak_rss_mb()
+    
+    pipeline = MedicalTo3D()
+    start = time.perf_counter()
+    pipeline.load_streaming(nrrd_path, slab_size=slab_size)
+    pipeline.preprocess_ct(window_min=-1000, window_max=4000)
+    pipeline.segment_threshold(0.3, 1.0)
+    elapsed = time.perf_counter() - start
+    
+    queue.put({
+        "path": f"out-of-core ({slab_size} slices)",
+        "seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "pipeline_rss_mb": round(peak_rss_mb() - baseline, 1),
+        "segmented_voxels": int(pipeline.volume_mask.array.sum()),
+    })
+
+def benchmark(shape=(200, 256, 256), slab_size=32):
+    context = multiprocessing.get_context("spawn")
+    
+    def run(target, *args):
+        queue = context.Queue()
+        process = context.Process(target=target, args=args + (queue,))
+        process.start()
+        result = queue.get()
+        process.join()
+        return result
+    
+    results = [run(run_path, native_hu, shape) for native_hu in (False, True)]
+    with tempfile.TemporaryDirectory() as tmp:
+        nrrd_path = os.path.join(tmp, "phantom.nrrd")
+        sitk.WriteImage(make_noisy_ct(shape), nrrd_path)
+        results.append(run(run_streaming, nrrd_path, slab_size))
+    return results
+
+if __name__ == "__main__":
+    print("⏱️  Benchmarking preprocessing + segmentation...")
+    for result in benchmark():
+        print(f"   {result['path']:>24}: {result['seconds']:.2f}s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB "
+              f"(+{result['pipeline_rss_mb']:.0f} MB for the pipeline), "
+              f"{result['segmented_voxels']:,} voxels segmented")
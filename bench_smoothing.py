@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark mesh smoothing: VTK windowed sinc vs the NumPy Taubin smoother
+Both smooth the same marching-cubes surface; reports wall time, passes run
+and how far each result (and the Gaussian-blurred mask variant) deviates
+from the VTK baseline
+"""
+
+import json
+import sys
+import time
+
+from bench_preprocessing import make_noisy_ct
+from med_pipeline import MedicalTo3D
+from mesh_smoothing import surface_deviation
+from stl_to_gltf import polydata_to_arrays
+
+VARIANTS = [
+    ("windowed_sinc", {"smoother": "windowed_sinc"}),
+    ("taubin", {"smoother": "taubin"}),
+    ("taubin x1 thread", {"smoother": "taubin", "smoothing_workers": 1}),
+    ("taubin, fixed passes", {"smoother": "taubin", "smoothing_tolerance": 0}),
+    ("gaussian mask + taubin", {"smoother": "taubin", "mask_sigma": 1.0}),
+]
+
+def benchmark(shape=(160, 256, 256), iterations=20, repeats=3):
+    pipeline = MedicalTo3D()
+    pipeline.image = make_noisy_ct(shape)
+    pipeline.preprocess_ct(native_hu=True)
+    pipeline.segment_threshold(500, 32767, hu=True)
+    
+    results, baseline = [], None
+    for name, options in VARIANTS:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            mesh = pipeline.generate_mesh(smoothing_iterations=iterations, **options)
+            timings.append(time.perf_counter() - start)
+        
+        smoothing = [record for record in pipeline.profiler.records if record["name"] == "smoothing"][-1]
+        vertices, _ = polydata_to_arrays(mesh)
+        if baseline is None:
+            baseline = vertices
+        result = {
+            "smoother": name,
+            "seconds": round(min(timings), 4),
+            "smoothing_seconds": round(smoothing["wall"], 4),
+            "passes": smoothing.get("iterations", iterations),
+            "triangles": mesh.GetNumberOfCells(),
+        }
+        # A blurred mask gives a different topology, so no per-vertex comparison
+        if len(vertices) == len(baseline):
+            result["deviation_mm"] = {key: round(value, 4) for key, value in surface_deviation(vertices, baseline).items()}
+        results.append(result)
+    return results
+
+if __name__ == "__main__":
+    print("⏱️  Benchmarking mesh smoothing...")
+    results = benchmark()
+    for result in results:
+        deviation = result.get("deviation_mm")
+        compared = f", {deviation['mean']:.3f} mm mean / {deviation['max']:.3f} mm max from VTK" if deviation else ""
+        print(f"   {result['smoother']:>24}: {result['smoothing_seconds']:.3f}s smoothing "
+              f"({result['passes']} passes), {result['triangles']:,} triangles{compared}")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as f:
+            json.dump(results, f, indent=2)
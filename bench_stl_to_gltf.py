@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark STL → GLTF conversion on synthetic meshes
+Compares the vectorized converter against the original per-point loop
+"""
+
+import vtk
+import json
+import base64
+import struct
+import os
+import tempfile
+import time
+import numpy as np
+
+from stl_to_gltf import stl_to_gltf
+
+def legacy_stl_to_gltf(stl_path):
+    """Original per-point implementation, kept as the reference for output and timing"""
+    reader = vtk.vtkSTLReader()
+    reader.SetFileName(stl_path)
+    reader.Update()
+    
+    mesh = reader.GetOutput()
+    points = mesh.GetPoints()
+    polys = mesh.GetPolys()
+    
+    vertices = []
+    for i in range(points.GetNumberOfPoints()):
+        point = points.GetPoint(i)
+        vertices.extend([point[0], point[1], point[2]])
+    
+    indices = []
+    polys.InitTraversal()
+    idList = vtk.vtkIdList()
+    while polys.GetNextCell(idList):
+        if idList.GetNumberOfIds() == 3:
+            indices.extend([idList.GetId(0), idList.GetId(1), idList.GetId(2)])
+    
+    normals = [0.0] * len(vertices)
+    for i in range(0, len(indices), 3):
+        i0, i1, i2 = indices[i], indices[i+1], indices[i+2]
+        v0 = np.array(vertices[i0*3:i0*3+3])
+        v1 = np.array(vertices[i1*3:i1*3+3])
+        v2 = np.array(vertices[i2*3:i2*3+3])
+        normal = np.cross(v1 - v0, v2 - v0)
+        length = np.linalg.norm(normal)
+        if length > 0:
+            normal /= length
+        for idx in [i0, i1, i2]:
+            normals[idx*3] += normal[0]
+            normals[idx*3+1] += normal[1]
+            normals[idx*3+2] += normal[2]
+    for i in range(0, len(normals), 3):
+        length = (normals[i]**2 + normals[i+1]**2 + normals[i+2]**2)**0.5
+        if length > 0:
+            normals[i] /= length
+            normals[i+1] /= length
+            normals[i+2] /= length
+    
+    return (struct.pack(f'{len(vertices)}f', *vertices),
+            struct.pack(f'{len(normals)}f', *normals),
+            struct.pack(f'{len(indices)}I', *indices))
+
+def make_sphere_stl(path, resolution):
+    """Write a synthetic UV sphere with roughly 2 * resolution² triangles"""
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(resolution)
+    sphere.SetPhiResolution(resolution)
+    sphere.SetRadius(50.0)
+    
+    writer = vtk.vtkSTLWriter()
+    writer.SetFileName(path)
+    writer.SetInputConnection(sphere.GetOutputPort())
+    writer.SetFileTypeToBinary()
+    writer.Write()
+
+def decode_buffers(gltf_path):
+    with open(gltf_path) as f:
+        gltf = json.load(f)
+    return [base64.b64decode(b["uri"].split(",", 1)[1]) for b in gltf["buffers"]]
+
+def benchmark(resolutions=(64, 128, 256), include_legacy=True):
+    results = []
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for resolution in resolutions:
+            stl_path = os.path.join(tmp, f"sphere_{resolution}.stl")
+            gltf_path = os.path.join(tmp, f"sphere_{resolution}.gltf")
+            make_sphere_stl(stl_path, resolution)
+            
+            start = time.perf_counter()
+            stl_to_gltf(stl_path, gltf_path)
+            fast_time = time.perf_counter() - start
+            
+            positions, normals, indices = decode_buffers(gltf_path)
+            result = {
+                "resolution": resolution,
+                "triangles": len(indices) // 12,
+                "vectorized_s": round(fast_time, 4),
+            }
+            
+            if include_legacy:
+                start = time.perf_counter()
+                legacy = legacy_stl_to_gltf(stl_path)
+                legacy_time = time.perf_counter() - start
+                
+                assert positions == legacy[0], "positions differ from legacy output"
+                assert indices == legacy[2], "indices differ from legacy output"
+                normal_error = np.abs(np.frombuffer(normals, np.float32) -
+                                      np.frombuffer(legacy[1], np.float32)).max()
+                assert normal_error < 1e-5, f"normals differ from legacy output ({normal_error})"
+                
+                result["legacy_s"] = round(legacy_time, 4)
+                result["speedup"] = round(legacy_time / fast_time, 1)
+            
+            results.append(result)
+    
+    return results
+
+if __name__ == "__main__":
+    print("⏱️  Benchmarking STL → GLTF conversion...")
+    for result in benchmark():
+        print(f"   🔺 {result['triangles']:>9,} triangles: "
+              f"{result['vectorized_s']:.3f}s vectorized, "
+              f"{result['legacy_s']:.3f}s legacy ({result['speedup']}x)")
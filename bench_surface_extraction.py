@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Benchmark surface extraction backends on the same segmentation
+Compares wall time and triangle counts for marching cubes and flying edges
+"""
+
+import json
+import sys
+import time
+import vtk
+
+from bench_preprocessing import make_noisy_ct
+from med_pipeline import MedicalTo3D, SURFACE_EXTRACTORS
+
+def benchmark(shape=(160, 256, 256), thread_counts=(1, 4), repeats=3):
+    pipeline = MedicalTo3D()
+    pipeline.image = make_noisy_ct(shape)
+    pipeline.preprocess_ct(native_hu=True)
+    pipeline.segment_threshold(500, 32767, hu=True)
+    
+    results = []
+    for method in SURFACE_EXTRACTORS:
+        for threads in thread_counts:
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                mesh = pipeline.generate_mesh(smoothing_iterations=0, method=method, threads=threads)
+                timings.append(time.perf_counter() - start)
+            
+            results.append({
+                "method": method,
+                "threads": threads,
+                "smp_backend": vtk.vtkSMPTools.GetBackend(),
+                "seconds": round(min(timings), 4),
+                "triangles": mesh.GetNumberOfCells(),
+                "vertices": mesh.GetNumberOfPoints(),
+            })
+    return results
+
+if __name__ == "__main__":
+    print("⏱️  Benchmarking surface extraction backends...")
+    results = benchmark()
+    for result in results:
+        print(f"   {result['method']:>22} x{result['threads']} ({result['smp_backend']}): "
+              f"{result['seconds']:.3f}s, {result['triangles']:,} triangles")
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as f:
+            json.dump(results, f, indent=2)
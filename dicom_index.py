@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Persistent header index for DICOM trees
+Headers are parsed once in a thread pool and remembered by file size and
+mtime; a chosen series is then decoded in parallel into one volume
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import SimpleITK as sitk
+
+from profiling import log
+
+INDEX_NAME = ".dicom_index.json"
+INDEX_VERSION = 1
+DEFAULT_IO_WORKERS = 16
+
+SERIES_UID = "0020|000e"
+SERIES_DESCRIPTION = "0008|103e"
+IMAGE_POSITION = "0020|0032"
+IMAGE_ORIENTATION = "0020|0037"
+INSTANCE_NUMBER = "0020|0013"
+
+def read_header(path):
+    """Series and geometry of one DICOM file, or None if it is not an image slice"""
+    reader = sitk.ImageFileReader()
+    reader.SetImageIO("GDCMImageIO")
+    reader.SetFileName(path)
+    reader.LoadPrivateTagsOff()
+    try:
+        reader.ReadImageInformation()
+    except RuntimeError:
+        return None
+    
+    keys = set(reader.GetMetaDataKeys())
+    if not {SERIES_UID, IMAGE_POSITION, IMAGE_ORIENTATION} <= keys:
+        return None
+    
+    def numbers(tag):
+        return [float(value) for value in reader.GetMetaData(tag).split('\\')]
+    
+    return {
+        "series": reader.GetMetaData(SERIES_UID).strip(),
+        "description": reader.GetMetaData(SERIES_DESCRIPTION).strip() if SERIES_DESCRIPTION in keys else "",
+        "position": numbers(IMAGE_POSITION),
+        "orientation": numbers(IMAGE_ORIENTATION),
+        "instance": int(numbers(INSTANCE_NUMBER)[0]) if INSTANCE_NUMBER in keys else 0,
+        "size": list(reader.GetSize()[:2]),
+        "spacing": list(reader.GetSpacing()),
+    }
+
+class DicomIndex:
+    def __init__(self, root, index_path=None, workers=DEFAULT_IO_WORKERS):
+        """Index of every DICOM slice under root, kept in root/.dicom_index.json
+        unless index_path says otherwise. workers sizes the I/O thread pool.
+        """
+        self.root = root
+        self.index_path = index_path or os.path.join(root, INDEX_NAME)
+        self.workers = workers
+        self.files = {}
+        
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                saved = json.load(f)
+            if saved.get("version") == INDEX_VERSION:
+                self.files = saved["files"]
+    
+    def scan(self, directories=None):
+        """Parse headers of new or changed files; returns how many were parsed
+
+        directories (relative to root) limits the walk, and the check for
+        removed files, to those subtrees instead of the whole tree.
+        """
+        tops = [os.path.normpath(os.path.join(self.root, d)) for d in directories or [""]]
+        prefixes = tuple(os.path.relpath(top, self.root) + os.sep for top in tops)
+        whole_tree = directories is None or "." + os.sep in prefixes
+        
+        found = {}
+        for top in [self.root] if whole_tree else tops:
+            for directory, dirs, names in os.walk(top):
+                dirs[:] = [name for name in dirs if not name.startswith('.')]
+                for name in names:
+                    if not name.startswith('.'):
+                        path = os.path.join(directory, name)
+                        stat = os.stat(path)
+                        found[os.path.relpath(path, self.root)] = [stat.st_size, stat.st_mtime_ns]
+        
+        stale = [relpath for relpath, stamp in found.items()
+                 if self.files.get(relpath, {}).get("stamp") != stamp]
+        removed = [relpath for relpath in self.files
+                   if relpath not in found and (whole_tree or relpath.startswith(prefixes))]
+        
+        if stale:
+            log.info(f"🔍 Reading {len(stale)} DICOM headers...")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                headers = executor.map(read_header, [os.path.join(self.root, p) for p in stale])
+                for relpath, header in zip(stale, headers):
+                    # Non-DICOM files are remembered too so they are not re-read
+                    self.files[relpath] = {"stamp": found[relpath], "header": header}
+        for relpath in removed:
+            del self.files[relpath]
+        
+        if stale or removed:
+            self.save()
+        return len(stale)
+    
+    def select(self, series_uid=None, rescan=False):
+        """The series to load (the largest without series_uid), its files brought up to date
+
+        The whole tree is only walked for a new index, with rescan, or when
+        series_uid is not in the index yet; otherwise just the directories
+        holding the series are rechecked, so loading from a large tree
+        (e.g. a network share of many studies) does not stat every file.
+        """
+        if rescan or not self.files or (series_uid is not None and series_uid not in self.series()):
+            self.scan()
+        else:
+            self.scan(self.series_directories(series_uid or self.largest_series()))
+        return series_uid or self.largest_series()
+    
+    def series_directories(self, series_uid):
+        """Directories (relative to root) holding a series' slices"""
+        return sorted({os.path.dirname(relpath) for relpath, entry in self.files.items()
+                       if entry["header"] is not None and entry["header"]["series"] == series_uid})
+    
+    def save(self):
+        temporary = self.index_path + ".tmp"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+            os.replace(temporary, self.index_path)
+        except OSError as e:
+            log.warning(f"⚠️  Could not save DICOM index: {e}")
+    
+    def series(self):
+        """Map SeriesInstanceUID -> list of (path, header), in no particular order"""
+        series = {}
+        for relpath, entry in self.files.items():
+            header = entry["header"]
+            if header is not None:
+                series.setdefault(header["series"], []).append((os.path.join(self.root, relpath), header))
+        return series
+    
+    def largest_series(self):
+        series = self.series()
+        if not series:
+            return None
+        return max(series, key=lambda uid: len(series[uid]))
+    
+    def load_series(self, series_uid):
+        """Decode one series into a SimpleITK volume, slices read in parallel"""
+        volume, spacing, origin, direction = self.decode_series(series_uid)
+        image = sitk.GetImageFromArray(volume)
+        image.SetSpacing(spacing)
+        image.SetOrigin(origin)
+        image.SetDirection(direction)
+        return image
+    
+    def decode_series(self, series_uid, allocate=np.empty):
+        """Decode one series into a z, y, x array; returns (array, spacing, origin, direction)
+
+        allocate(shape, dtype) creates the array the slices are written into,
+        e.g. a memory-mapped file for volumes that should stay on disk.
+        """
+        slices = self.series().get(series_uid)
+        if not slices:
+            raise ValueError(f"Series {series_uid} not found under {self.root}")
+        
+        # Order along the slice normal, as GDCM does
+        header = slices[0][1]
+        row, column = np.array(header["orientation"][:3]), np.array(header["orientation"][3:])
+        normal = np.cross(row, column)
+        slices.sort(key=lambda item: (float(np.dot(item[1]["position"], normal)), item[1]["instance"]))
+        depths = np.array([np.dot(h["position"], normal) for _, h in slices])
+        
+        paths = [path for path, _ in slices]
+        first = sitk.ReadImage(paths[0])
+        width, height = first.GetSize()[:2]
+        volume = allocate((len(paths), height, width), sitk.GetArrayViewFromImage(first).dtype)
+        volume[0] = sitk.GetArrayViewFromImage(first).reshape(height, width)
+        
+        def decode(index):
+            # Keep the slice referenced while its buffer is copied: the view does not
+            slice_image = sitk.ReadImage(paths[index])
+            volume[index] = sitk.GetArrayViewFromImage(slice_image).reshape(height, width)
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(decode, range(1, len(paths))))
+        
+        slice_spacing = float(np.median(np.diff(depths))) if len(depths) > 1 else header["spacing"][2]
+        spacing = (header["spacing"][0], header["spacing"][1], slice_spacing)
+        direction = np.column_stack([row, column, normal]).ravel().tolist()
+        return volume, spacing, slices[0][1]["position"], direction
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Asynchronous conversion jobs with progress streaming
+An asyncio job manager runs MedicalTo3D conversions in an executor, shares
+one job between identical requests and fans the pipeline's progress events
+out to any number of subscribers (e.g. server-sent event streams)
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_process import DONE_MARKER, process_study
+from profiling import log
+from stage_cache import files_digest
+
+FINISHED = ("done", "failed")
+
+def job_id(study, recipe, fingerprint=None):
+    """Identical study + recipe requests share one job (and its outputs)
+
+    fingerprint (see study_fingerprint()) ties the job to the study's current
+    files, so a study replaced at the same path gets a new job, and new URLs.
+    """
+    payload = json.dumps({"study": study, "recipe": recipe, "fingerprint": fingerprint}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def study_fingerprint(study_path):
+    """files_digest() of a study: the volume file, or every file in a DICOM folder
+
+    Dotfiles and dot-directories are skipped, as DicomIndex does: the job
+    itself writes .dicom_index.json into the study folder.
+    """
+    if not os.path.isdir(study_path):
+        return files_digest([study_path])
+    paths = []
+    for root, dirs, names in os.walk(study_path):
+        dirs[:] = [name for name in dirs if not name.startswith('.')]
+        paths.extend(os.path.join(root, name) for name in names if not name.startswith('.'))
+    return files_digest(paths)
+
+def run_job(job, name, study_path, output_dir, recipe, events):
+    """Executor entry point: process_study() posting its progress to events as (job, event)"""
+    return process_study(name, study_path, output_dir, recipe,
+                         progress=lambda event: events.put((job, event)))
+
+def format_sse(event):
+    """One server-sent event; the event type is the event's "type" field"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+class Job:
+    def __init__(self, id, study, name, output_dir):
+        self.id = id
+        self.study = study
+        self.name = name
+        self.output_dir = output_dir
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.progress = None
+        self.task = None
+        self.subscribers = set()
+    
+    def as_dict(self):
+        record = {"id": self.id, "study": self.study, "status": self.status}
+        if self.error is not None:
+            record["error"] = self.error
+        if self.result is not None:
+            record["result"] = self.result
+        return record
+
+class JobManager:
+    """Conversion jobs keyed by job_id(), run on a pool of worker processes
+
+    The manager lives on one asyncio event loop: either the caller's (await
+    start()) or its own background thread (start_thread(), for WSGI apps,
+    which then reach it through call()).
+    """
+    def __init__(self, output_root, executor=None, workers=None):
+        self.output_root = output_root
+        self.jobs = {}
+        self.loop = None
+        self._manager = None
+        if executor is None:
+            context = multiprocessing.get_context("spawn")
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, max_tasks_per_child=1)
+            # Worker processes post progress through a manager queue proxy
+            self._manager = context.Manager()
+            self.events = self._manager.Queue()
+        else:
+            self.events = queue.Queue()
+        self.executor = executor
+    
+    async def start(self):
+        """Attach to the running loop and start forwarding worker progress"""
+        self.loop = asyncio.get_running_loop()
+        threading.Thread(target=self._forward_events, daemon=True).start()
+    
+    def start_thread(self):
+        """Run the manager on its own event loop in a daemon thread"""
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self.start(), loop).result()
+        return self
+    
+    def call(self, coroutine, timeout=None):
+        """Run a coroutine on the manager's loop from another thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+    
+    def shutdown(self):
+        """Cancel queued jobs and wait for running ones to finish"""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.events.put(None)
+        if self._manager is not None:
+            self._manager.shutdown()
+    
+    def status(self, key):
+        """Snapshot of a job as a dict, or None for an unknown job"""
+        job = self.jobs.get(key)
+        return None if job is None else job.as_dict()
+    
+    async def submit(self, study_path, recipe, study):
+        """Job for study + recipe; an identical queued, running or finished job is reused
+
+        Jobs are also keyed by the study's files (stat'ed off the event loop),
+        so outputs of a study since replaced are never served for it.
+        """
+        fingerprint = await self.loop.run_in_executor(None, study_fingerprint, study_path)
+        key = job_id(study, recipe, fingerprint)
+        job = self.jobs.get(key)
+        if job is not None and job.status != "failed":
+            return job
+        
+        name = os.path.splitext(os.path.basename(study_path.rstrip("/\\")))[0] or "study"
+        job = Job(key, study, name, os.path.join(self.output_root, "jobs", key))
+        self.jobs[key] = job
+        
+        done_path = os.path.join(job.output_dir, name, DONE_MARKER)
+        if os.path.exists(done_path):
+            # Finished in an earlier run of the server
+            with open(done_path) as f:
+                job.result = json.load(f)
+            job.status = "done"
+            return job
+        
+        log.info(f"📥 Job {key}: {study}")
+        job.task = asyncio.create_task(self._run(job, study_path, recipe))
+        return job
+    
+    async def _run(self, job, study_path, recipe):
+        try:
+            result = await self.loop.run_in_executor(
+                self.executor, run_job, job.id, job.name, study_path, job.output_dir, recipe, self.events)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            log.warning(f"❌ Job {job.id} failed: {job.error}")
+            self._set_status(job, "failed")
+        else:
+            job.result = result
+            log.info(f"✅ Job {job.id} done")
+            self._set_status(job, "done")
+    
+    def _forward_events(self):
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            self.loop.call_soon_threadsafe(self._progress, *item)
+    
+    def _progress(self, key, event):
+        job = self.jobs.get(key)
+        if job is None or job.status in FINISHED:
+            return
+        if job.status == "queued":
+            # The first event means a worker picked the job up
+            self._set_status(job, "running")
+        job.progress = dict(event, type="progress")
+        self._publish(job, job.progress)
+    
+    def _set_status(self, job, status):
+        job.status = status
+        self._publish(job, dict(job.as_dict(), type="status"))
+    
+    def _publish(self, job, event):
+        for subscriber in job.subscribers:
+            subscriber.put_nowait(event)
+    
+    async def subscribe(self, key):
+        """Async iterator over a job's events until it finishes
+
+        Starts with the job's current status and latest progress, so late
+        subscribers catch up; status events follow every change of status.
+        """
+        job = self.jobs[key]
+        events = asyncio.Queue()
+        job.subscribers.add(events)
+        try:
+            yield dict(job.as_dict(), type="status")
+            if job.status in FINISHED:
+                return
+            if job.progress is not None:
+                yield job.progress
+            while True:
+                event = await events.get()
+                yield event
+                if event["type"] == "status" and event["status"] in FINISHED:
+                    return
+        finally:
+            job.subscribers.discard(events)
@@ -5,59 +5,264 @@ Converts DICOM/NRRD medical images to interactive GLTF models
 """
 
 import SimpleITK as sitk
-import vtk
 import numpy as np
+import importlib
+import math
 import os
+import shutil
+import tempfile
+import weakref
 from pathlib import Path
 import json
 import base64
 import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from stl_to_gltf import arrays_to_polydata, polydata_to_arrays, polydata_to_gltf
+from dicom_index import DicomIndex
+from profiling import Profiler, log, profiled
+from slab_stream import (DEFAULT_SLAB_SIZE, MappedVolume, label_components, map_volume, median_slabs,
+                         bounding_box_of, release, select_labels, spill_array)
+from mesh_smoothing import DEFAULT_TOLERANCE, smooth_vertices, vertex_adjacency
+from stage_cache import DEFAULT_MAX_BYTES, StageCache, files_digest, image_digest
+from volume_bricks import DEFAULT_BRICK_SIZE, DEFAULT_MAX_SIZE, export_bricks
+from vtk_bridge import apply_direction, sitk_to_vtk
+
+DEFAULT_LOD_RATIOS = (1.0, 0.25, 0.05, 0.01)
+# Surface extractors for a 0/1 mask: display name, VTK filter (module, class), contour value.
+# VTK modules are imported by the stage that first needs them, so importing the
+# pipeline (in the API server, start.py or each batch worker) stays cheap.
+SURFACE_EXTRACTORS = {
+    "marching_cubes": ("Marching Cubes", ("vtkFiltersCore", "vtkMarchingCubes"), 0.5),
+    "flying_edges": ("Flying Edges", ("vtkFiltersCore", "vtkFlyingEdges3D"), 0.5),
+    "discrete_flying_edges": ("Discrete Flying Edges", ("vtkFiltersGeneral", "vtkDiscreteFlyingEdges3D"), 1),
+}
+DEFAULT_SURFACE_METHOD = "flying_edges"
+SMOOTHERS = ("windowed_sinc", "taubin")
+# VTK's filter stays the default: on one CPU the NumPy Taubin smoother was
+# about twice as slow (bench_smoothing.py), with no multi-core gain measured yet
+DEFAULT_SMOOTHER = "windowed_sinc"
+# Voxels kept around the segmentation's bounding box: one for the median
+# filter's radius and one so marching cubes sees background on every side
+ROI_PADDING = 2
 
 class MedicalTo3D:
-    def __init__(self):
+    def __init__(self, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES):
+        """cache_dir enables the on-disk stage cache (see stage_cache.py).
+
+        Each stage result is keyed by its input's key and its own parameters,
+        so a rerun picks up at the nearest cached stage. Cached volumes are
+        read back through self.image / self.segmentation on first access, so
+        a cached stage returns its image just like one that ran.
+        """
+        self.cache = StageCache(cache_dir, cache_max_bytes) if cache_dir else None
+        self.profiler = Profiler()
+        self._deferred = {}
+        self._stage_keys = {}
         self.image = None
         self.segmentation = None
         self.mesh = None
+        self.lods = None
+        self.roi = None
+        self.window = None
+        self.native_hu = False
+        self.labels = None
+        self.tissues = None
+        self.label_meshes = None
+        self.volume = None
+        self.volume_mask = None
+        self.slab_size = DEFAULT_SLAB_SIZE
+        self._spill_dir = None
+    
+    @profiled
+    def load_dicom_series(self, dicom_folder, series_uid=None, index_path=None, index=None, rescan=False):
+        """Load a DICOM series from a folder (searched recursively)
+
+        Headers are indexed once into a persistent DicomIndex and the slices
+        are decoded in parallel. Without series_uid the series with the most
+        slices is loaded. A saved index (or one passed in as index) is reused:
+        only the chosen series' directories are rechecked, unless rescan asks
+        for a walk of the whole folder (see DicomIndex.select()).
+        """
+        log.info(f"Loading DICOM series from {dicom_folder}")
+        index = index or DicomIndex(dicom_folder, index_path)
+        series_uid = index.select(series_uid, rescan)
+        if series_uid is None:
+            raise ValueError(f"No DICOM files found in {dicom_folder}")
         
-    def load_dicom_series(self, dicom_folder):
-        """Load DICOM series from folder"""
-        print(f"Loading DICOM series from {dicom_folder}")
-        
-        series_reader = sitk.ImageSeriesReader()
-        dicom_names = series_reader.GetGDCMSeriesFileNames(dicom_folder)
+        files = [path for path, _ in index.series().get(series_uid, [])]
+        self.volume = self.volume_mask = None
+        key = self._stage_key("load", source=files_digest(files)) if self.cache and files else None
+        if self._restore("image", key):
+            return self.image
         
-        if not dicom_names:
-            raise ValueError(f"No DICOM files found in {dicom_folder}")
-            
-        series_reader.SetFileNames(dicom_names)
-        self.image = series_reader.Execute()
-        print(f"Loaded image: {self.image.GetSize()} voxels")
+        self.image = index.load_series(series_uid)
+        log.info(f"Loaded image: {self.image.GetSize()} voxels")
+        self.profiler.annotate(voxels=self.image.GetNumberOfPixels(), slices=len(files))
+        self._store("image", key)
         return self.image
     
+    @profiled
     def load_nrrd(self, nrrd_path):
         """Load NRRD file"""
-        print(f"Loading NRRD from {nrrd_path}")
+        log.info(f"Loading NRRD from {nrrd_path}")
+        self.volume = self.volume_mask = None
+        key = self._stage_key("load", source=files_digest([nrrd_path])) if self.cache else None
+        if self._restore("image", key):
+            return self.image
+        
         self.image = sitk.ReadImage(nrrd_path)
-        print(f"Loaded image: {self.image.GetSize()} voxels")
+        log.info(f"Loaded image: {self.image.GetSize()} voxels")
+        self.profiler.annotate(voxels=self.image.GetNumberOfPixels())
+        self._store("image", key)
         return self.image
     
-    def preprocess_ct(self, window_min=-1000, window_max=4000):
-        """Pre-process CT scan"""
-        print("Pre-processing CT scan...")
-        self.image = sitk.Cast(self.image, sitk.sitkFloat32)
+    @profiled
+    def load_streaming(self, path, series_uid=None, slab_size=DEFAULT_SLAB_SIZE, spill_dir=None, index=None,
+                       rescan=False):
+        """Open a scan (volume file or DICOM folder) out-of-core instead of loading it
+
+        The volume stays on disk, memory-mapped, and preprocess_ct(),
+        segment_threshold() and generate_mesh() then stream it in z-slabs of
+        slab_size slices. Intermediates are spilled to memory-mapped files in
+        a scratch folder under spill_dir (the system temp folder by default),
+        removed along with the pipeline. Peak memory follows the slab size;
+        only the final mesh is held whole. The stage cache is not used.
+        DICOM folders are indexed as in load_dicom_series().
+        """
+        log.info(f"Opening {path} out-of-core ({slab_size}-slice slabs)")
+        self._spill_dir = tempfile.mkdtemp(prefix="medical3d_", dir=spill_dir)
+        weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
         
-        windower = sitk.IntensityWindowingImageFilter()
-        windower.SetWindowMinimum(window_min)
-        windower.SetWindowMaximum(window_max) 
-        windower.SetOutputMinimum(0.0)
-        windower.SetOutputMaximum(1.0)
+        if os.path.isdir(path):
+            index = index or DicomIndex(path)
+            series_uid = index.select(series_uid, rescan)
+            if series_uid is None:
+                raise ValueError(f"No DICOM files found in {path}")
+            spill = lambda shape, dtype: spill_array(self._spill_dir, "volume", shape, dtype)
+            self.volume = MappedVolume(*index.decode_series(series_uid, spill))
+            release(self.volume.array)
+        else:
+            self.volume = map_volume(path, self._spill_dir, slab_size)
+        
+        self.slab_size = slab_size
+        self.image = self.segmentation = self.volume_mask = self.roi = None
+        self.profiler.annotate(voxels=self.volume.GetNumberOfPixels())
+        log.info(f"Opened volume: {self.volume.GetSize()} voxels")
+        return self.volume
+    
+    @profiled
+    def preprocess_ct(self, window_min=-1000, window_max=4000, native_hu=False):
+        """Pre-process CT scan
+
+        By default the volume is cast to float32 and windowed to [0, 1]. With
+        native_hu the volume stays in Hounsfield units as int16 (half the
+        size of float32); the window is only remembered, thresholds given in
+        window units are converted to HU, and display_image() applies it.
+        """
+        log.info("Pre-processing CT scan...")
+        self.window = (window_min, window_max)
+        self.native_hu = native_hu
+        if self.volume is not None:
+            # Out-of-core: the window is applied slab by slab while segmenting
+            return None
         
-        self.image = windower.Execute(self.image)
+        key = self._stage_key("preprocess", "image", window=[window_min, window_max], native_hu=native_hu)
+        if self._restore("image", key):
+            return self.image
+        
+        self.profiler.annotate(voxels=self.image.GetNumberOfPixels())
+        if native_hu:
+            if self.image.GetPixelID() != sitk.sitkInt16:
+                with self.profiler.stage("cast"):
+                    self.image = sitk.Cast(self.image, sitk.sitkInt16)
+        else:
+            with self.profiler.stage("windowing"):
+                self.image = self._apply_window(sitk.Cast(self.image, sitk.sitkFloat32))
+        
+        self._store("image", key)
         return self.image
     
-    def segment_threshold(self, lower_threshold=0.3, upper_threshold=1.0):
-        """Segment using threshold"""
-        print(f"Segmenting with threshold [{lower_threshold}, {upper_threshold}]")
+    def display_image(self):
+        """The volume windowed to [0, 1] float32, for display and export"""
+        if not self.native_hu:
+            return self.image
+        return self._apply_window(sitk.Cast(self.image, sitk.sitkFloat32))
+    
+    @profiled
+    def resample(self, spacing=None, max_voxels=None, threads=None):
+        """Resample the volume onto an isotropic grid, before segmenting
+
+        spacing is the target voxel size in mm; max_voxels coarsens it (or,
+        alone, the native finest spacing) until the grid fits that budget, and
+        a scan already within budget is left alone. The grid covers the same
+        physical box. Intensities are interpolated linearly and any existing
+        segmentation or label map by nearest neighbour. The filters run on
+        threads threads (SimpleITK's default: one per CPU).
+        """
+        if spacing is None and max_voxels is None:
+            raise ValueError("resample() needs a target spacing and/or max_voxels")
+        if self.volume is not None:
+            raise ValueError("Resampling needs an in-memory image; load it with load_nrrd() or load_dicom_series()")
+        
+        size, grid = _isotropic_grid(self.image, spacing, max_voxels)
+        if grid is None:
+            log.info(f"Keeping native grid {size} ({np.prod(size):,} voxels within budget)")
+            return self.image
+        
+        key = self._stage_key("resample", "image", spacing=spacing, max_voxels=max_voxels)
+        log.info(f"Resampling {size} to {grid[0]} at {grid[1][0]:.3f} mm isotropic")
+        if not self._restore("image", key):
+            # Window units put air at 0; native HU at the window floor
+            background = self.window[0] if self.native_hu and self.window else 0
+            with self.profiler.stage("intensities", voxels=int(np.prod(grid[0]))):
+                self.image = _resample(self.image, grid, sitk.sitkLinear, background, threads, self.profiler)
+            self._store("image", key)
+        # Indexed in the native grid
+        self.roi = None
+        
+        for attr in ("segmentation", "labels"):
+            mask = getattr(self, attr)
+            if mask is not None:
+                with self.profiler.stage(attr):
+                    mask_grid = _isotropic_grid(mask, grid[1][0])[1]
+                    setattr(self, attr, _resample(mask, mask_grid, sitk.sitkNearestNeighbor, 0, threads))
+        self.profiler.annotate(voxels=int(np.prod(grid[0])))
+        return self.image
+    
+    @profiled
+    def segment_threshold(self, lower_threshold=0.3, upper_threshold=1.0, crop=True, hu=False,
+                          keep=1, min_volume=0.0):
+        """Segment using threshold
+
+        Thresholds are in window units ([0, 1]) unless hu is set, in which
+        case they are Hounsfield units; either is converted to match the
+        image produced by preprocess_ct().
+        
+        Only the keep largest connected components are kept (keep >= 1, or
+        all of them with keep=None), and components under min_volume mm³ are
+        dropped.
+        
+        With crop, the segmentation is cut down to the padded bounding box of
+        the kept components before smoothing, so the median filter and
+        meshing only touch that region. The cropped image keeps its physical
+        origin, and self.roi records (index, size) in the full scan.
+        """
+        if keep is not None and keep < 1:
+            raise ValueError(f"keep must be at least 1 (or None for every component), got {keep}")
+        log.info(f"Segmenting with threshold [{lower_threshold}, {upper_threshold}]{' HU' if hu else ''}")
+        if self.volume is not None:
+            return self._segment_slabs(*self._image_thresholds(lower_threshold, upper_threshold, hu), crop,
+                                       keep, self._volume_voxels(min_volume))
+        
+        key = self._stage_key("segment", "image", lower=lower_threshold, upper=upper_threshold,
+                              crop=crop, hu=hu, keep=keep, min_volume=min_volume)
+        if key is not None and self.cache.has(key, "meta") and self._restore("segmentation", key):
+            self.roi = self.cache.load_meta(key)["roi"]
+            return self.segmentation
+        
+        lower_threshold, upper_threshold = self._image_thresholds(lower_threshold, upper_threshold, hu)
         
         thresholder = sitk.BinaryThresholdImageFilter()
         thresholder.SetLowerThreshold(lower_threshold)
@@ -65,87 +270,677 @@ class MedicalTo3D:
         thresholder.SetInsideValue(1)
         thresholder.SetOutsideValue(0)
         
-        self.segmentation = thresholder.Execute(self.image)
-        self.segmentation = self._keep_largest_component()
+        self.profiler.watch(thresholder)
+        with self.profiler.stage("threshold", voxels=self.image.GetNumberOfPixels()):
+            self.segmentation = thresholder.Execute(self.image)
+        with self.profiler.stage("connected components"):
+            self.segmentation = self._keep_largest_components(keep, self._volume_voxels(min_volume))
+        
+        if crop and self.roi is not None:
+            index, size = self.roi
+            log.info(f"Cropping to ROI {size} at {index}")
+            self.segmentation = sitk.RegionOfInterest(self.segmentation, size, index)
         
-        smoother = sitk.BinaryMedianImageFilter()
+        smoother = self.profiler.watch(sitk.BinaryMedianImageFilter())
         smoother.SetRadius([1, 1, 1])
-        self.segmentation = smoother.Execute(self.segmentation)
+        with self.profiler.stage("median filter", voxels=self.segmentation.GetNumberOfPixels()):
+            self.segmentation = smoother.Execute(self.segmentation)
+        self.profiler.annotate(voxels=self.segmentation.GetNumberOfPixels())
         
+        if key is not None:
+            self.cache.save_meta(key, {"roi": self.roi})
+        self._store("segmentation", key)
         return self.segmentation
     
-    def generate_mesh(self, smoothing_iterations=20):
-        """Generate mesh using Marching Cubes"""
-        print("Generating mesh with Marching Cubes...")
+    @profiled
+    def segment_labels(self, tissues, hu=False):
+        """Segment several tissues into one label map in a single sweep
+
+        tissues is a list of (name, lower, upper[, color]) intensity ranges,
+        in window units or in HU with hu=True. Voxels are labelled 1..N in
+        list order; where ranges overlap the later tissue wins. The label map
+        is stored in self.labels and returned.
+        """
+        names = ", ".join(tissue[0] for tissue in tissues)
+        log.info(f"Segmenting {len(tissues)} tissues in one pass: {names}")
+        
+        ranges = [self._image_thresholds(tissue[1], tissue[2], hu) for tissue in tissues]
+        values = sitk.GetArrayViewFromImage(self.image)
+        
+        self.labels = sitk.GetImageFromArray(_label_ranges(values, ranges))
+        self.labels.CopyInformation(self.image)
+        self.tissues = [(tissue[0], list(tissue[3]) if len(tissue) > 3 else [0.8, 0.8, 0.9])
+                        for tissue in tissues]
+        self.label_meshes = None
+        return self.labels
+    
+    @profiled
+    def generate_label_meshes(self, smoothing_iterations=10):
+        """Extract every tissue surface from self.labels in one pass
+
+        Uses discrete flying edges over all labels at once, smooths the
+        combined surface and splits it per label. Returns and stores
+        {name: (vtkPolyData, color)}; tissues with no voxels are left out.
+        """
+        from vtkmodules.util import numpy_support
+        from vtkmodules.vtkFiltersCore import vtkWindowedSincPolyDataFilter
+        from vtkmodules.vtkFiltersGeneral import vtkDiscreteFlyingEdges3D
         
-        vtk_image = self._sitk_to_vtk(self.segmentation)
+        log.info(f"Generating {len(self.tissues)} tissue meshes with discrete flying edges...")
         
-        marching_cubes = vtk.vtkMarchingCubes()
-        marching_cubes.SetInputData(vtk_image)
-        marching_cubes.SetValue(0, 0.5)
-        marching_cubes.Update()
+        extractor = self.profiler.watch(vtkDiscreteFlyingEdges3D())
+        extractor.SetInputData(sitk_to_vtk(self.labels, mask=True))
+        extractor.GenerateValues(len(self.tissues), 1, len(self.tissues))
+        extractor.ComputeNormalsOff()
+        extractor.ComputeScalarsOn()
+        with self.profiler.stage("surface extraction", voxels=self.labels.GetNumberOfPixels()) as stage:
+            extractor.Update()
+            surface = apply_direction(extractor.GetOutput(), self.labels)
+            stage["triangles"] = surface.GetNumberOfCells()
         
-        if smoothing_iterations > 0:
-            print(f"Smoothing mesh ({smoothing_iterations} iterations)...")
-            smoother = vtk.vtkWindowedSincPolyDataFilter()
-            smoother.SetInputConnection(marching_cubes.GetOutputPort())
+        if smoothing_iterations > 0 and surface.GetNumberOfPoints():
+            log.info(f"Smoothing meshes ({smoothing_iterations} iterations)...")
+            smoother = self.profiler.watch(vtkWindowedSincPolyDataFilter())
+            smoother.SetInputData(surface)
             smoother.SetNumberOfIterations(smoothing_iterations)
             smoother.SetPassBand(0.001)
-            smoother.Update()
-            self.mesh = smoother.GetOutput()
+            with self.profiler.stage("smoothing", triangles=surface.GetNumberOfCells()):
+                smoother.Update()
+            surface = smoother.GetOutput()
+        self.profiler.annotate(triangles=surface.GetNumberOfCells())
+        
+        self.label_meshes = {}
+        if not surface.GetNumberOfPoints():
+            return self.label_meshes
+        
+        vertices, indices = polydata_to_arrays(surface)
+        point_labels = numpy_support.vtk_to_numpy(surface.GetPointData().GetScalars())
+        triangle_labels = point_labels[indices[:, 0]]
+        
+        for label, (name, color) in enumerate(self.tissues, start=1):
+            triangles = indices[triangle_labels == label]
+            if len(triangles) == 0:
+                continue
+            used, local = np.unique(triangles, return_inverse=True)
+            mesh = arrays_to_polydata(vertices[used], local.reshape(-1, 3))
+            self.label_meshes[name] = (mesh, color)
+            log.info(f"   {name}: {mesh.GetNumberOfPoints():,} vertices")
+        
+        return self.label_meshes
+    
+    @profiled
+    def export_label_meshes(self, output_pattern="outputs/{name}.glb", quantize=False):
+        """Export each tissue mesh to its own file with its own material colour"""
+        paths = {}
+        for name, (mesh, color) in self.label_meshes.items():
+            output_path = output_pattern.format(name=name)
+            log.info(f"Exporting {name} to {output_path}")
+            polydata_to_gltf(mesh, output_path, color, quantize=quantize)
+            paths[name] = output_path
+        return paths
+    
+    @profiled
+    def generate_mesh(self, smoothing_iterations=20, brick_size=None, workers=None,
+                      method=DEFAULT_SURFACE_METHOD, threads=None, smoother=DEFAULT_SMOOTHER,
+                      smoothing_tolerance=DEFAULT_TOLERANCE, mask_sigma=None, smoothing_workers=None):
+        """Generate mesh from the segmentation
+
+        method picks the surface extractor: "flying_edges" (vtkFlyingEdges3D,
+        multithreaded through VTK's SMP backend), "marching_cubes" (serial
+        vtkMarchingCubes) or "discrete_flying_edges" (for label maps).
+        threads sets the SMP thread count (switching VTK off its Sequential
+        backend if needed); None leaves VTK's defaults.
+        
+        With brick_size set, the segmentation is split into z-slabs of that
+        many slices which are meshed in parallel worker processes (workers,
+        default one per CPU) and welded back together along their shared
+        planes. The result has the same vertices and triangles as the
+        monolithic mesh, only in a different order.
+        
+        smoother "windowed_sinc" (the default) runs vtkWindowedSincPolyDataFilter
+        for smoothing_iterations; "taubin" runs the NumPy smoother in
+        mesh_smoothing.py (smoothing_workers threads, default one per CPU,
+        split each pass) for at most smoothing_iterations passes, stopping
+        early once the mean vertex displacement per pass drops below
+        smoothing_tolerance mean edge lengths. Taubin is an alternative, not
+        a faster path: on one CPU it runs slower than VTK's filter. mask_sigma (mm) blurs the mask with a Gaussian
+        before extraction, which rounds off voxel steps before any mesh
+        smoothing; it needs the in-memory, monolithic path.
+        """
+        if method not in SURFACE_EXTRACTORS:
+            raise ValueError(f"Unknown surface method {method!r}, expected one of {sorted(SURFACE_EXTRACTORS)}")
+        if smoother not in SMOOTHERS:
+            raise ValueError(f"Unknown smoother {smoother!r}, expected one of {SMOOTHERS}")
+        if mask_sigma and (brick_size or self.volume_mask is not None or method == "discrete_flying_edges"):
+            raise ValueError("mask_sigma needs a monolithic flying_edges or marching_cubes extraction")
+        
+        log.info(f"Generating mesh with {SURFACE_EXTRACTORS[method][0]}...")
+        streaming = self.volume_mask is not None
+        key = None if streaming else self._stage_key("mesh", "segmentation",
+                                                     smoothing_iterations=smoothing_iterations, method=method,
+                                                     smoother=smoother, smoothing_tolerance=smoothing_tolerance,
+                                                     mask_sigma=mask_sigma)
+        if key is not None and self.cache.has(key, "mesh"):
+            log.info(f"♻️  Using cached mesh ({key[:12]})")
+            self.mesh = self.cache.load_mesh(key)
+            self.profiler.annotate(cached=True, triangles=self.mesh.GetNumberOfCells())
+            self.lods = None
+            return self.mesh
+        
+        if threads:
+            _configure_smp(threads)
+        
+        source = self.volume_mask if streaming else self.segmentation
+        with self.profiler.stage("surface extraction", voxels=source.GetNumberOfPixels()) as stage:
+            if brick_size or streaming:
+                surface = self._bricked_marching_cubes(brick_size or self.slab_size, workers, method)
+            else:
+                # Gradient normals go stale once the points are smoothed; the glTF
+                # export recomputes them from the final geometry instead
+                extractor = self.profiler.watch(_surface_extractor(method, compute_normals=smoothing_iterations <= 0))
+                if mask_sigma:
+                    # The blurred mask's 0.5 level is the smoothed boundary
+                    blurred = sitk.SmoothingRecursiveGaussian(sitk.Cast(self.segmentation, sitk.sitkFloat32), mask_sigma)
+                    extractor.SetInputData(sitk_to_vtk(blurred))
+                else:
+                    extractor.SetInputData(sitk_to_vtk(self.segmentation, mask=True))
+                extractor.Update()
+                surface = apply_direction(extractor.GetOutput(), self.segmentation)
+            stage["triangles"] = surface.GetNumberOfCells()
+        
+        if smoothing_iterations > 0 and smoother == "taubin":
+            log.info(f"Smoothing mesh (Taubin, up to {smoothing_iterations} passes)...")
+            with self.profiler.stage("smoothing", triangles=surface.GetNumberOfCells()) as stage:
+                vertices, indices = polydata_to_arrays(surface)
+                offsets, neighbors = vertex_adjacency(indices, len(vertices))
+                vertices, stage["iterations"] = smooth_vertices(vertices, offsets, neighbors, smoothing_iterations,
+                                                                smoothing_tolerance, workers=smoothing_workers,
+                                                                progress=self.profiler.progress)
+                self.mesh = arrays_to_polydata(vertices, indices)
+            log.info(f"   Converged after {stage['iterations']} passes")
+        elif smoothing_iterations > 0:
+            from vtkmodules.vtkFiltersCore import vtkWindowedSincPolyDataFilter
+            
+            log.info(f"Smoothing mesh ({smoothing_iterations} iterations)...")
+            sinc_filter = self.profiler.watch(vtkWindowedSincPolyDataFilter())
+            sinc_filter.SetInputData(surface)
+            sinc_filter.SetNumberOfIterations(smoothing_iterations)
+            sinc_filter.SetPassBand(0.001)
+            with self.profiler.stage("smoothing", triangles=surface.GetNumberOfCells()):
+                sinc_filter.Update()
+            self.mesh = sinc_filter.GetOutput()
         else:
-            self.mesh = marching_cubes.GetOutput()
+            self.mesh = surface
         
-        print(f"Generated mesh: {self.mesh.GetNumberOfPoints()} vertices")
+        self.lods = None
+        log.info(f"Generated mesh: {self.mesh.GetNumberOfPoints()} vertices")
+        self.profiler.annotate(triangles=self.mesh.GetNumberOfCells())
+        if key is not None:
+            self.cache.save_mesh(key, self.mesh)
         return self.mesh
     
-    def export_gltf(self, output_path, embed_data=True):
-        """Export mesh as GLTF"""
-        print(f"Exporting GLTF to {output_path}")
+    def _bricked_marching_cubes(self, brick_size, workers=None, method=DEFAULT_SURFACE_METHOD):
+        """Surface extraction over overlapping z-slabs, welded on the shared planes"""
+        if self.volume_mask is not None:
+            source, mask = self.volume_mask, self.volume_mask.array
+        else:
+            source, mask = self.segmentation, sitk.GetArrayViewFromImage(self.segmentation)
+        depth = mask.shape[0]
+        starts = list(range(0, max(depth - 1, 1), brick_size))
+        log.info(f"   {len(starts)} slabs of up to {brick_size} slices")
+        
+        def slab(z0):
+            array = np.ascontiguousarray(mask[z0:min(z0 + brick_size, depth - 1) + 1], dtype=np.uint8)
+            release(mask)
+            return array
+        
+        if workers == 1 or len(starts) == 1:
+            results = []
+            for z0 in starts:
+                results.append(_march_slab(slab(z0), z0, method))
+                self.profiler.progress(len(results) / len(starts))
+        else:
+            # Only a few slabs in flight, so an out-of-core mask is never read in whole
+            in_flight = 2 * (workers or os.cpu_count() or 1)
+            results, pending = [], deque()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for z0 in starts:
+                    if len(pending) >= in_flight:
+                        results.append(pending.popleft().result())
+                        self.profiler.progress(len(results) / len(starts))
+                    pending.append(executor.submit(_march_slab, slab(z0), z0, method))
+                for future in pending:
+                    results.append(future.result())
+                    self.profiler.progress(len(results) / len(starts))
+        
+        vertices, indices = _weld_slabs(results, starts[1:])
+        vertices = vertices * np.array(source.GetSpacing()) + np.array(source.GetOrigin())
+        return apply_direction(arrays_to_polydata(vertices, indices), source)
+    
+    @profiled
+    def generate_lods(self, ratios=DEFAULT_LOD_RATIOS, max_workers=None):
+        """Build a level-of-detail chain from the current mesh with quadric decimation
+
+        Each ratio is the fraction of triangles kept; every level is decimated
+        from the full mesh, in parallel worker processes. The chain is cached
+        until generate_mesh() runs again. Returns [(ratio, vtkPolyData), ...]
+        ordered finest first.
+        """
+        ratios = tuple(sorted(ratios, reverse=True))
+        if self.lods is not None and tuple(r for r, _ in self.lods) == ratios:
+            return self.lods
+        
+        log.info(f"Building LOD chain {ratios}...")
+        vertices, indices = polydata_to_arrays(self.mesh)
+        reduced = [r for r in ratios if r < 1.0]
+        
+        if max_workers == 1 or len(reduced) <= 1:
+            results = [_decimate(vertices, indices, r) for r in reduced]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or len(reduced)) as executor:
+                results = list(executor.map(_decimate, [vertices] * len(reduced),
+                                            [indices] * len(reduced), reduced))
+        
+        levels = {r: arrays_to_polydata(*result) for r, result in zip(reduced, results)}
+        self.lods = [(r, self.mesh if r >= 1.0 else levels[r]) for r in ratios]
+        
+        for ratio, mesh in self.lods:
+            log.info(f"   LOD {ratio:.0%}: {mesh.GetNumberOfCells():,} triangles")
+        return self.lods
+    
+    @profiled
+    def export_gltf(self, output_path, embed_data=True, color=[0.8, 0.8, 0.9], quantize=False):
+        """Export mesh as GLTF (.gltf) or binary GLTF (.glb)
+
+        quantize stores positions/normals as int16/int8 (KHR_mesh_quantization)
+        and reorders the triangles for vertex-cache locality.
+        """
+        log.info(f"Exporting GLTF to {output_path}")
+        
+        vertex_count = polydata_to_gltf(self.mesh, output_path, color, embed_data, quantize)
+        self.profiler.annotate(triangles=self.mesh.GetNumberOfCells())
         
-        # Simple GLTF export - you can expand this
-        writer = vtk.vtkSTLWriter()
-        writer.SetFileName(output_path.replace('.gltf', '.stl'))
+        log.info(f"✅ Model exported: {vertex_count:,} vertices")
+        return output_path
+    
+    @profiled
+    def export_stl(self, output_path):
+        """Export mesh as STL"""
+        from vtkmodules.vtkIOGeometry import vtkSTLWriter
+        
+        log.info(f"Exporting STL to {output_path}")
+        
+        writer = vtkSTLWriter()
+        writer.SetFileName(output_path)
         writer.SetInputData(self.mesh)
         writer.Write()
         
-        print("✅ Model exported (STL format for now)")
+        log.info("✅ Model exported as STL")
         return output_path
     
-    def _keep_largest_component(self):
-        """Keep only the largest connected component"""
-        connected_filter = sitk.ConnectedComponentImageFilter()
-        connected = connected_filter.Execute(self.segmentation)
+    @profiled
+    def export_lods(self, output_path, color=[0.8, 0.8, 0.9], quantize=False, ratios=DEFAULT_LOD_RATIOS):
+        """Export the LOD chain as one GLB per level plus a JSON manifest
+
+        For output_path 'skull.glb' this writes skull_lod0.glb (full) ...
+        skull_lodN.glb (coarsest) and skull.lod.json, which lists the levels
+        coarsest first so the viewer can refine progressively.
+        """
+        stem = os.path.splitext(output_path)[0]
+        levels = []
         
-        label_stats = sitk.LabelShapeStatisticsImageFilter()
-        label_stats.Execute(connected)
+        for level, (ratio, mesh) in enumerate(self.generate_lods(ratios)):
+            level_path = f"{stem}_lod{level}.glb"
+            log.info(f"Exporting LOD {level} to {level_path}")
+            polydata_to_gltf(mesh, level_path, color, quantize=quantize)
+            levels.append({"uri": os.path.basename(level_path), "ratio": ratio,
+                           "triangles": mesh.GetNumberOfCells()})
         
-        if label_stats.GetNumberOfLabels() == 0:
-            return self.segmentation
+        manifest_path = f"{stem}.lod.json"
+        with open(manifest_path, 'w') as f:
+            json.dump({"levels": levels[::-1]}, f, indent=2)
+        
+        log.info(f"✅ LOD chain exported: {manifest_path}")
+        return manifest_path
+    
+    @profiled
+    def export_volume_bricks(self, output_dir, dtype="uint16", value_range=None,
+                             brick_size=DEFAULT_BRICK_SIZE, max_size=DEFAULT_MAX_SIZE):
+        """Export self.image as a bricked texture pyramid for ray marching in the viewer
+
+        Writes output_dir/volume.json and raw dtype bricks (see volume_bricks.py).
+        Intensities are exported as they are: HU unless preprocess_ct()
+        windowed them; value_range defaults to the image's min and max.
+        """
+        if self.volume is not None:
+            raise ValueError("Volume bricks need the image in memory (not load_streaming())")
+        
+        units = "window" if self.window is not None and not self.native_hu else "HU"
+        log.info(f"Exporting {dtype} volume bricks to {output_dir}...")
+        self.profiler.annotate(voxels=self.image.GetNumberOfPixels())
+        manifest_path = export_bricks(self.image, output_dir, value_range, dtype, brick_size, max_size, units)
+        log.info(f"✅ Volume exported: {manifest_path}")
+        return manifest_path
+    
+    def _segment_slabs(self, lower_threshold, upper_threshold, crop, keep=1, min_voxels=0):
+        """segment_threshold() for an out-of-core volume: the same filters, streamed
+
+        Thresholding and components run slab by slab (components are merged
+        across slab seams), and the median filter reads one halo slice on
+        each side, so the result equals the in-memory segmentation.
+        """
+        thresholder = sitk.BinaryThresholdImageFilter()
+        thresholder.SetLowerThreshold(lower_threshold)
+        thresholder.SetUpperThreshold(upper_threshold)
+        thresholder.SetInsideValue(1)
+        thresholder.SetOutsideValue(0)
+        
+        def binarize(slab):
+            if not self.native_hu:
+                slab = self._apply_window(sitk.Cast(slab, sitk.sitkFloat32))
+            elif slab.GetPixelID() != sitk.sitkInt16:
+                slab = sitk.Cast(slab, sitk.sitkInt16)
+            return thresholder.Execute(slab)
+        
+        volume = self.volume
+        shape = volume.array.shape
+        with self.profiler.stage("connected components", voxels=volume.GetNumberOfPixels()):
+            labels = spill_array(self._spill_dir, "labels", shape, np.uint32)
+            # Labelling is the first half of this step's progress, selection the second
+            root, sizes = label_components(volume, binarize, labels, self.slab_size,
+                                           lambda done: self.profiler.progress(done / 2))
+            # Largest first, ties in raster order as RelabelComponentImageFilter ranks them
+            ranked = np.argsort(-sizes, kind="stable")
+            ranked = ranked[(sizes[ranked] > 0) & (sizes[ranked] >= min_voxels)][:keep]
+            log.info(f"Keeping {len(ranked)} of {np.count_nonzero(sizes):,} components")
             
-        largest_label = max(label_stats.GetLabels(), 
-                          key=lambda l: label_stats.GetPhysicalSize(l))
+            mask = spill_array(self._spill_dir, "mask", shape, np.uint8)
+            bounding_box = select_labels(labels, np.isin(root, ranked), mask, self.slab_size,
+                                         lambda done: self.profiler.progress(0.5 + done / 2))
         
-        threshold_filter = sitk.BinaryThresholdImageFilter()
-        threshold_filter.SetLowerThreshold(largest_label)
-        threshold_filter.SetUpperThreshold(largest_label)
-        threshold_filter.SetInsideValue(1)
-        threshold_filter.SetOutsideValue(0)
+        self.roi = _padded_region(bounding_box, volume.GetSize()) if bounding_box else None
+        if crop and self.roi is not None:
+            index, size = self.roi
+            log.info(f"Cropping to ROI {size} at {index}")
+        else:
+            index, size = [0, 0, 0], list(volume.GetSize())
         
-        return threshold_filter.Execute(connected)
+        segmentation = spill_array(self._spill_dir, "segmentation", size[::-1], np.uint8)
+        with self.profiler.stage("median filter", voxels=int(np.prod(size))):
+            median_slabs(mask, index, size, segmentation, self.slab_size, self.profiler.progress)
+        
+        self.volume_mask = volume.region(index, segmentation)
+        self.profiler.annotate(voxels=self.volume_mask.GetNumberOfPixels())
+        return self.volume_mask
     
-    def _sitk_to_vtk(self, sitk_image):
-        """Convert SimpleITK image to VTK"""
-        array = sitk.GetArrayFromImage(sitk_image)
-        vtk_array = vtk.util.numpy_support.numpy_to_vtk(array.ravel(), deep=True)
+    def _keep_largest_components(self, keep=1, min_voxels=0):
+        """Keep the keep largest connected components (all if None) of at least min_voxels
+
+        RelabelComponentImageFilter ranks components by voxel count alone,
+        which stays fast on fragmented masks with many thousands of labels
+        (LabelShapeStatisticsImageFilter computes every shape feature for each).
+        """
+        components = self.profiler.watch(sitk.ConnectedComponentImageFilter())
+        relabel = sitk.RelabelComponentImageFilter()
+        relabel.SetMinimumObjectSize(int(min_voxels))
+        relabel.SortByObjectSizeOn()
+        ranked = relabel.Execute(components.Execute(self.segmentation))
+        
+        count = relabel.GetNumberOfObjects()
+        kept = count if keep is None else min(keep, count)
+        log.info(f"Keeping {kept} of {count:,} components")
+        mask = sitk.BinaryThreshold(ranked, 1, max(kept, 1), 1, 0)
+        
+        bounding_box = bounding_box_of(sitk.GetArrayViewFromImage(mask)) if kept else None
+        self.roi = _padded_region(bounding_box, mask.GetSize()) if bounding_box else None
+        return mask
+    
+    @property
+    def image(self):
+        return self._materialize("image")
+    
+    @image.setter
+    def image(self, value):
+        self._set_stage("image", value)
+    
+    @property
+    def segmentation(self):
+        return self._materialize("segmentation")
+    
+    @segmentation.setter
+    def segmentation(self, value):
+        self._set_stage("segmentation", value)
+    
+    def _materialize(self, attr):
+        """Read a deferred cached volume on first access"""
+        loader = self._deferred.pop(attr, None)
+        if loader is not None:
+            setattr(self, "_" + attr, loader())
+        return getattr(self, "_" + attr)
+    
+    def _set_stage(self, attr, value, key=None):
+        self._deferred.pop(attr, None)
+        setattr(self, "_" + attr, value)
+        self._stage_keys[attr] = key
+    
+    def _stage_key(self, stage, upstream_attr=None, **params):
+        """Cache key of a stage, or None without a cache
+
+        Volumes assigned directly (not produced by a cached stage) are keyed
+        by a digest of their content.
+        """
+        if self.cache is None:
+            return None
+        
+        upstream = None
+        if upstream_attr:
+            upstream = self._stage_keys.get(upstream_attr)
+            if upstream is None and self._materialize(upstream_attr) is not None:
+                upstream = image_digest(getattr(self, upstream_attr))
+                self._stage_keys[upstream_attr] = upstream
+        return self.cache.key(stage, upstream, **params)
+    
+    def _restore(self, attr, key):
+        """Serve a volume stage from the cache, deferring the read until first use"""
+        if key is None or not self.cache.has(key, "image"):
+            return False
+        
+        log.info(f"♻️  Using cached {attr} ({key[:12]})")
+        self.profiler.annotate(cached=True)
+        self._set_stage(attr, None, key)
+        self._deferred[attr] = lambda: self.cache.load_image(key)
+        return True
+    
+    def _store(self, attr, key):
+        self._stage_keys[attr] = key
+        if key is not None:
+            self.cache.save_image(key, getattr(self, attr))
+    
+    def _volume_voxels(self, volume_mm3):
+        """Voxel count of a physical volume in the current scan's spacing"""
+        if not volume_mm3:
+            return 0
+        spacing = (self.volume or self.image).GetSpacing()
+        return math.ceil(volume_mm3 / float(np.prod(spacing)))
+    
+    def _apply_window(self, image):
+        windower = sitk.IntensityWindowingImageFilter()
+        windower.SetWindowMinimum(self.window[0])
+        windower.SetWindowMaximum(self.window[1]) 
+        windower.SetOutputMinimum(0.0)
+        windower.SetOutputMaximum(1.0)
+        return windower.Execute(image)
+    
+    def _image_thresholds(self, lower, upper, hu):
+        """Convert thresholds to the units of self.image"""
+        if hu == self.native_hu:
+            return lower, upper
         
-        vtk_image = vtk.vtkImageData()
-        vtk_image.SetDimensions(sitk_image.GetSize())
-        vtk_image.SetSpacing(sitk_image.GetSpacing())
-        vtk_image.SetOrigin(sitk_image.GetOrigin())
-        vtk_image.GetPointData().SetScalars(vtk_array)
+        if self.window is None:
+            raise ValueError("HU thresholds need the window set by preprocess_ct()")
+        window_min, window_max = self.window
         
-        return vtk_image
+        if hu:
+            # HU -> window units; the window clamps, so HU beyond it saturate
+            scale = window_max - window_min
+            return (lower - window_min) / scale, (upper - window_min) / scale
+        
+        # Window units -> HU; 0 and 1 cover everything the window clamped
+        info = np.iinfo(np.int16)
+        lower = info.min if lower <= 0 else math.ceil(window_min + lower * (window_max - window_min))
+        upper = info.max if upper >= 1 else math.floor(window_min + upper * (window_max - window_min))
+        return lower, upper
+    
+    def _sitk_to_vtk(self, sitk_image):
+        """Convert SimpleITK image to VTK (shares the pixel buffer)"""
+        return sitk_to_vtk(sitk_image)
+
+def _label_ranges(values, ranges, slab_voxels=1 << 24):
+    """Label map (uint8) from inclusive [lower, upper] ranges in one pass
+
+    The range bounds become sorted bin edges in the image's own dtype and a
+    lookup table maps each bin to the last range covering it, so every voxel
+    is classified by a single searchsorted. Work is done in z-slabs to keep
+    the intp bin indices small.
+    """
+    dtype = values.dtype
+    starts, stops = [], []
+    for lower, upper in ranges:
+        if np.issubdtype(dtype, np.integer):
+            info = np.iinfo(dtype)
+            start = max(math.ceil(lower), info.min)
+            stop = math.floor(upper) + 1 if upper < info.max else None
+        else:
+            start = dtype.type(lower)
+            if start < lower:
+                start = np.nextafter(start, dtype.type(np.inf))
+            stop = dtype.type(upper)
+            if stop <= upper:
+                stop = np.nextafter(stop, dtype.type(np.inf))
+        starts.append(start)
+        stops.append(stop)
+    
+    edges = np.unique(np.array([e for e in starts + stops if e is not None], dtype=dtype))
+    lut = np.zeros(len(edges) + 1, dtype=np.uint8)
+    for label, (start, stop) in enumerate(zip(starts, stops), start=1):
+        first = np.searchsorted(edges, start) + 1
+        last = len(edges) if stop is None else np.searchsorted(edges, stop)
+        lut[first:last + 1] = label
+    
+    labels = np.empty(values.shape, dtype=np.uint8)
+    step = max(1, slab_voxels // max(1, values[0].size))
+    for z in range(0, len(values), step):
+        labels[z:z + step] = lut[np.searchsorted(edges, values[z:z + step], side='right')]
+    return labels
+
+def _padded_region(bounding_box, full_size, padding=ROI_PADDING):
+    """(index, size) of a bounding box grown by padding, clipped to the image"""
+    dimension = len(bounding_box) // 2
+    index = [max(bounding_box[d] - padding, 0) for d in range(dimension)]
+    end = [min(bounding_box[d] + bounding_box[d + dimension] + padding, full_size[d])
+           for d in range(dimension)]
+    return index, [end[d] - index[d] for d in range(dimension)]
+
+def _decimate(vertices, indices, ratio):
+    """Quadric-decimate a triangle mesh to the given fraction of its triangles"""
+    from vtkmodules.vtkFiltersCore import vtkQuadricDecimation
+    
+    decimator = vtkQuadricDecimation()
+    decimator.SetInputData(arrays_to_polydata(vertices, indices))
+    decimator.SetTargetReduction(1.0 - ratio)
+    decimator.VolumePreservationOn()
+    decimator.Update()
+    return polydata_to_arrays(decimator.GetOutput())
+
+def _isotropic_grid(image, spacing=None, max_voxels=None):
+    """(native size, (size, spacing, origin)) of an isotropic grid over image's box
+
+    The grid is None when only max_voxels is given and image already fits it.
+    """
+    size = np.array(image.GetSize())
+    extent = size * np.array(image.GetSpacing())
+    if spacing is None:
+        if size.prod() <= max_voxels:
+            return size.tolist(), None
+        spacing = float(np.min(image.GetSpacing()))
+    if max_voxels:
+        # Coarsest of the two; rounding sizes up can overshoot, so nudge until it fits
+        spacing = max(spacing, (extent.prod() / max_voxels) ** (1 / 3))
+        while np.ceil(extent / spacing).prod() > max_voxels:
+            spacing *= 1.001
+    
+    grid_size = np.maximum(np.ceil(extent / spacing - 1e-6), 1).astype(int)
+    # Keep the box's corner: voxel centres sit half a voxel inside it
+    shift = (spacing - np.array(image.GetSpacing())) / 2
+    origin = np.array(image.GetOrigin()) + np.array(image.GetDirection()).reshape(3, 3) @ shift
+    return size.tolist(), (grid_size.tolist(), [float(spacing)] * 3, origin.tolist())
+
+def _resample(image, grid, interpolator, background, threads=None, profiler=None):
+    size, spacing, origin = grid
+    resampler = sitk.ResampleImageFilter()
+    resampler.SetSize(size)
+    resampler.SetOutputSpacing(spacing)
+    resampler.SetOutputOrigin(origin)
+    resampler.SetOutputDirection(image.GetDirection())
+    resampler.SetInterpolator(interpolator)
+    resampler.SetDefaultPixelValue(background)
+    if threads:
+        resampler.SetNumberOfThreads(threads)
+    if profiler is not None:
+        profiler.watch(resampler)
+    return resampler.Execute(image)
+
+def _configure_smp(threads):
+    """Run VTK's SMP-parallel filters on the given number of threads"""
+    from vtkmodules.vtkCommonCore import vtkSMPTools as smp
+    
+    if smp.GetBackend() == "Sequential" and threads > 1:
+        smp.SetBackend("STDThread")
+    smp.Initialize(threads)
+
+def _surface_extractor(method, compute_normals=False):
+    """Configured VTK filter that extracts the surface of a 0/1 mask"""
+    name, (module, factory), value = SURFACE_EXTRACTORS[method]
+    factory = getattr(importlib.import_module(f"vtkmodules.{module}"), factory)
+    extractor = factory()
+    extractor.SetValue(0, value)
+    extractor.SetComputeNormals(compute_normals)
+    return extractor
+
+def _march_slab(slab, z0, method=DEFAULT_SURFACE_METHOD):
+    """Surface extraction on one uint8 slab in voxel-index coordinates"""
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkCommonDataModel import vtkImageData
+    
+    vtk_image = vtkImageData()
+    vtk_image.SetDimensions(slab.shape[2], slab.shape[1], slab.shape[0])
+    vtk_image.SetOrigin(0, 0, z0)
+    vtk_image.GetPointData().SetScalars(numpy_support.numpy_to_vtk(slab.ravel(), deep=False))
+    
+    extractor = _surface_extractor(method)
+    extractor.SetInputData(vtk_image)
+    extractor.Update()
+    return polydata_to_arrays(extractor.GetOutput())
+
+def _weld_slabs(results, seams):
+    """Concatenate slab meshes, merging vertices that lie on a shared seam plane
+
+    Slabs are meshed in index space, so a vertex on a seam is computed from the
+    same voxels by both neighbours and comes out bit-identical.
+    """
+    offsets = np.cumsum([0] + [len(vertices) for vertices, _ in results])
+    vertices = np.concatenate([v for v, _ in results]) if results else np.zeros((0, 3), np.float32)
+    indices = np.concatenate([i.astype(np.int64) + offset for (_, i), offset in zip(results, offsets)])
+    
+    remap = np.arange(len(vertices))
+    on_seam = np.flatnonzero(np.isin(vertices[:, 2], np.asarray(seams, dtype=np.float32)))
+    if on_seam.size:
+        _, first, inverse = np.unique(vertices[on_seam], axis=0, return_index=True, return_inverse=True)
+        remap[on_seam] = on_seam[first][inverse.ravel()]
+    
+    keep = remap == np.arange(len(vertices))
+    compact = np.cumsum(keep) - 1
+    return vertices[keep], compact[remap][indices].astype(np.uint32)
 
 def main():
     """Example usage"""
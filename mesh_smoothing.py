@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Mesh smoothing on NumPy adjacency arrays
+A Taubin (lambda/mu) smoother over a CSR vertex adjacency, split across
+threads by vertex block, that stops once the vertices stop moving instead
+of always running a fixed number of iterations. An opt-in alternative to
+VTK's windowed sinc filter, which is faster on a single CPU
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Taubin's lambda and pass band; mu follows as 1 / (pass_band - 1 / lambda)
+DEFAULT_LAMBDA = 0.5
+DEFAULT_PASS_BAND = 0.1
+# Stop once a lambda/mu pass moves vertices less than this, relative to the mean edge length
+DEFAULT_TOLERANCE = 5e-3
+# Most vertices in one block, the unit of work when a pass is split across threads
+CHUNK_VERTICES = 1 << 16
+
+def vertex_adjacency(indices, vertex_count):
+    """CSR vertex adjacency of a triangle mesh: neighbors[offsets[v]:offsets[v + 1]] are v's neighbours"""
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    # Both directions of every edge, sorted by source vertex and deduplicated
+    # (sort + compare: np.unique is many times slower on arrays this size)
+    keys = np.sort(np.concatenate([edges[:, 0] * vertex_count + edges[:, 1],
+                                   edges[:, 1] * vertex_count + edges[:, 0]]))
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    sources, neighbors = np.divmod(keys, vertex_count)
+    
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=vertex_count), out=offsets[1:])
+    return offsets, neighbors
+
+def mean_edge_length(vertices, offsets, neighbors):
+    if len(neighbors) == 0:
+        return 0.0
+    sources = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return float(np.linalg.norm(np.take(vertices, neighbors, axis=0) - np.take(vertices, sources, axis=0), axis=1).mean())
+
+def degree_blocks(offsets, neighbors, chunk=CHUNK_VERTICES):
+    """Split a CSR adjacency into blocks of vertices sharing one degree
+
+    Returns (order, blocks): order sorts vertices by degree, and each block
+    (start, end, columns) covers vertices [start, end) of that order with
+    columns[j] holding every vertex's j-th neighbour (in the same order).
+    Summing whole columns replaces a ragged per-row reduction.
+    """
+    degree = np.diff(offsets)
+    order = np.argsort(degree, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    
+    blocks = []
+    bounds = np.flatnonzero(np.diff(degree[order])) + 1
+    for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+        d = int(degree[order[first]]) if last > first else 0
+        for start in range(first, last, chunk):
+            end = min(start + chunk, last)
+            rows = offsets[order[start:end]][:, None] + np.arange(d)
+            blocks.append((start, end, np.ascontiguousarray(rank[neighbors[rows]].T)))
+    return order, blocks
+
+def _laplacian(vertices, block, out):
+    """Umbrella operator (neighbour mean minus vertex) for one degree_blocks() block"""
+    start, end, columns = block
+    if len(columns) == 0:
+        # Isolated vertices stay put
+        out[start:end] = 0
+        return
+    
+    total = np.take(vertices, columns[0], axis=0)
+    for column in columns[1:]:
+        total += np.take(vertices, column, axis=0)
+    total *= 1.0 / len(columns)
+    np.subtract(total, vertices[start:end], out=out[start:end])
+
+def smooth_vertices(vertices, offsets, neighbors, iterations=20, tolerance=DEFAULT_TOLERANCE,
+                    relaxation=DEFAULT_LAMBDA, pass_band=DEFAULT_PASS_BAND, workers=None, progress=None):
+    """Taubin-smooth vertices (N x 3) over a vertex_adjacency(); returns (vertices, passes run)
+
+    Each pass is a shrinking lambda step followed by an inflating mu step,
+    so the surface is smoothed without the volume loss of plain Laplacian
+    smoothing. Stops after iterations passes, or earlier once a pass moves
+    vertices by less than tolerance times the mean edge length on average
+    (tolerance=0 always runs every pass). Passes are split across workers
+    threads by vertex block (default: one per CPU). progress, if given, is
+    called with the fraction of passes done.
+    """
+    threshold = tolerance * mean_edge_length(np.asarray(vertices, dtype=np.float32), offsets, neighbors)
+    order, blocks = degree_blocks(offsets, neighbors)
+    # Smoothed in degree order, so each block's vertices are one contiguous slice;
+    # float32 like the mesh points, which also halves the memory traffic of each step
+    ordered = np.asarray(vertices, dtype=np.float32)[order]
+    laplacian = np.empty_like(ordered)
+    mu = 1.0 / (pass_band - 1.0 / relaxation)
+    workers = workers or os.cpu_count() or 1
+    
+    def step(executor, factor):
+        if executor is None:
+            for block in blocks:
+                _laplacian(ordered, block, laplacian)
+        else:
+            list(executor.map(lambda block: _laplacian(ordered, block, laplacian), blocks))
+        np.multiply(laplacian, factor, out=laplacian)
+        np.add(ordered, laplacian, out=ordered)
+    
+    executor = ThreadPoolExecutor(workers) if workers > 1 and len(blocks) > 1 else None
+    passes = 0
+    try:
+        while passes < iterations:
+            previous = ordered.copy()
+            step(executor, relaxation)
+            step(executor, mu)
+            passes += 1
+            if progress:
+                progress(passes / iterations)
+            if threshold > 0 and np.linalg.norm(ordered - previous, axis=1).mean() < threshold:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    
+    smoothed = np.empty_like(ordered)
+    smoothed[order] = ordered
+    return smoothed, passes
+
+def surface_deviation(vertices, reference):
+    """Mean and max distance between corresponding vertices of two meshes with the same topology"""
+    distances = np.linalg.norm(np.asarray(vertices) - np.asarray(reference), axis=1)
+    return {"mean": float(distances.mean()), "max": float(distances.max())} if len(distances) else {"mean": 0.0, "max": 0.0}
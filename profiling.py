@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Per-stage profiling, progress and logging for the pipeline
+Records wall time, CPU time, peak RSS and voxel/triangle counts for each
+stage, exported as a JSON report or a Chrome trace (chrome://tracing), and
+forwards stage progress (including VTK/ITK filter progress) to listeners
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Progress below this step within a stage is not forwarded to listeners
+PROGRESS_STEP = 0.01
+
+# Pipeline messages go through this logger; by default they are printed as
+# before. Turn them off under load with log.setLevel(logging.WARNING).
+log = logging.getLogger("medical3d")
+if not log.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(os.environ.get("MEDICAL3D_LOG_LEVEL", "INFO"))
+    log.propagate = False
+
+# Per-stage peaks come from Linux's resettable RSS high-water mark (VmHWM),
+# shared by every open stage of every profiler in the process. Resetting it
+# also resets ru_maxrss, so the highest mark read is remembered as well.
+_high_water_lock = threading.Lock()
+_open_peaks = {}
+_high_water_supported = sys.platform.startswith("linux")
+_process_peak = 0.0
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max(peak / (1024 ** 2 if sys.platform == "darwin" else 1024), _process_peak)
+
+def _high_water_mb():
+    """RSS high-water mark since the last call, in MB, which then resets it (None if unsupported)"""
+    global _high_water_supported, _process_peak
+    if not _high_water_supported:
+        return None
+    try:
+        with open("/proc/self/status") as f:
+            peak = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except (OSError, StopIteration, ValueError):
+        _high_water_supported = False
+        return None
+    _process_peak = max(_process_peak, peak / 1024)
+    return peak / 1024
+
+def _track_peak(record, opening):
+    """Fold the high-water mark into every open stage, then start or finish tracking record"""
+    with _high_water_lock:
+        peak = _high_water_mb()
+        if peak is None:
+            return None
+        for key in _open_peaks:
+            _open_peaks[key] = max(_open_peaks[key], peak)
+        if opening:
+            _open_peaks[id(record)] = 0.0
+            return None
+        return _open_peaks.pop(id(record), None)
+
+class Profiler:
+    def __init__(self):
+        self.records = []
+        self.listeners = []
+        self._stack = []
+        self._origin = time.perf_counter()
+        self._last_progress = 0.0
+    
+    @contextmanager
+    def stage(self, name, **counts):
+        """Time a stage; stages opened inside it are recorded as its children.
+
+        CPU time covers this process only, not the worker processes some
+        stages fan out to.
+        """
+        record = {"name": name, "depth": len(self._stack), "start": time.perf_counter() - self._origin}
+        record.update(counts)
+        self.records.append(record)
+        self._stack.append(record)
+        _track_peak(record, opening=True)
+        self._notify(0.0)
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall"] = time.perf_counter() - self._origin - record["start"]
+            record["cpu"] = time.process_time() - cpu
+            # This stage's own peak (Linux only); the process peak so far never goes down
+            record["peak_rss_mb"] = _track_peak(record, opening=False)
+            record["process_peak_rss_mb"] = peak_rss_mb()
+            self._notify(1.0)
+            self._stack.pop()
+            log.debug(f"⏱️  {'  ' * record['depth']}{name}: {record['wall']:.3f}s wall, {record['cpu']:.3f}s CPU")
+    
+    def progress(self, fraction):
+        """Report progress (0-1) of the innermost open stage to the listeners"""
+        # Completion is reported when the stage closes
+        if self._stack and self.listeners and fraction < 1.0 and abs(fraction - self._last_progress) >= PROGRESS_STEP:
+            self._notify(fraction)
+    
+    def watch(self, process_object):
+        """Forward a VTK algorithm's or SimpleITK filter's progress to progress()"""
+        if hasattr(process_object, "AddObserver"):
+            process_object.AddObserver("ProgressEvent", lambda caller, event: self.progress(caller.GetProgress()))
+        else:
+            import SimpleITK as sitk
+            process_object.AddCommand(sitk.sitkProgressEvent, lambda: self.progress(process_object.GetProgress()))
+        return process_object
+    
+    def _notify(self, fraction):
+        self._last_progress = fraction
+        if not self.listeners:
+            return
+        
+        event = {
+            "stage": self._stack[0]["name"],
+            "step": self._stack[-1]["name"],
+            "progress": round(fraction, 3),
+            "elapsed": round(time.perf_counter() - self._origin, 3),
+        }
+        for listener in self.listeners:
+            listener(event)
+    
+    def annotate(self, **counts):
+        """Attach counts (voxels, triangles, ...) to the innermost open stage"""
+        if self._stack:
+            self._stack[-1].update(counts)
+    
+    def totals(self):
+        """Wall seconds per top-level stage name, summed over repeats"""
+        totals = {}
+        for record in self.records:
+            if record["depth"] == 0 and "wall" in record:
+                totals[record["name"]] = totals.get(record["name"], 0.0) + record["wall"]
+        return totals
+    
+    def report(self):
+        return {"stages": self.records, "totals": self.totals(), "peak_rss_mb": peak_rss_mb()}
+    
+    def save_report(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+    
+    def save_chrome_trace(self, path):
+        """Write the stages as complete ("X") events for chrome://tracing or Perfetto"""
+        fixed = {"name", "depth", "start", "wall"}
+        events = [{
+            "name": record["name"],
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record.get("wall", 0.0) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": {key: value for key, value in record.items() if key not in fixed},
+        } for record in self.records]
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+def profiled(method):
+    """Record a MedicalTo3D method as a top-level profiler stage"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.profiler.stage(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Out-of-core volumes for MedicalTo3D
+Scans too large for memory are memory-mapped and processed in z-slabs;
+intermediates are spilled to memory-mapped files so peak memory follows
+the slab size rather than the study size
+"""
+
+import mmap
+import os
+import numpy as np
+import SimpleITK as sitk
+
+from profiling import log
+
+DEFAULT_SLAB_SIZE = 64
+
+# NRRD "type:" spellings -> numpy dtype (without byte order)
+NRRD_TYPES = {
+    "signed char": "i1", "int8": "i1", "int8_t": "i1",
+    "uchar": "u1", "unsigned char": "u1", "uint8": "u1", "uint8_t": "u1",
+    "short": "i2", "short int": "i2", "signed short": "i2", "signed short int": "i2", "int16": "i2", "int16_t": "i2",
+    "ushort": "u2", "unsigned short": "u2", "unsigned short int": "u2", "uint16": "u2", "uint16_t": "u2",
+    "int": "i4", "signed int": "i4", "int32": "i4", "int32_t": "i4",
+    "uint": "u4", "unsigned int": "u4", "uint32": "u4", "uint32_t": "u4",
+    "float": "f4", "double": "f8",
+}
+
+class MappedVolume:
+    """A z, y, x array (usually memory-mapped) with its physical geometry
+
+    Implements the SimpleITK geometry getters, so it can stand in for an
+    image in apply_direction() and the like without ever being loaded.
+    """
+    def __init__(self, array, spacing, origin, direction):
+        self.array = array
+        self.spacing = tuple(float(s) for s in spacing)
+        self.origin = tuple(float(o) for o in origin)
+        self.direction = tuple(float(d) for d in direction)
+    
+    def GetSize(self):
+        return tuple(int(n) for n in self.array.shape[::-1])
+    
+    def GetSpacing(self):
+        return self.spacing
+    
+    def GetOrigin(self):
+        return self.origin
+    
+    def GetDirection(self):
+        return self.direction
+    
+    def GetDimension(self):
+        return 3
+    
+    def GetNumberOfPixels(self):
+        return int(self.array.size)
+    
+    def index_to_point(self, index):
+        direction = np.array(self.direction).reshape(3, 3)
+        return tuple(np.array(self.origin) + direction @ (np.array(index, dtype=np.float64) * self.spacing))
+    
+    def region(self, index, array):
+        """Volume for a sub-box starting at index (x, y, z), in the same frame"""
+        return MappedVolume(array, self.spacing, self.index_to_point(index), self.direction)
+    
+    def slab(self, z0, z1):
+        """Slices [z0, z1) as an in-memory SimpleITK image placed in the same frame"""
+        image = sitk.GetImageFromArray(np.ascontiguousarray(self.array[z0:z1]))
+        image.SetSpacing(self.spacing)
+        image.SetOrigin(self.index_to_point((0, 0, z0)))
+        image.SetDirection(self.direction)
+        return image
+
+def spill_array(spill_dir, name, shape, dtype):
+    """Memory-mapped scratch array backed by a .npy file in spill_dir"""
+    return np.lib.format.open_memmap(os.path.join(spill_dir, f"{name}.npy"), mode='w+',
+                                     dtype=dtype, shape=tuple(shape))
+
+def release(*arrays):
+    """Drop memory-mapped arrays' pages from this process's resident set
+
+    Shared file mappings keep their data in the page cache and on disk, so
+    this only stops pages already processed from counting towards our RSS.
+    """
+    for array in arrays:
+        # np.memmap views keep the mmap object on their base array
+        mapping = getattr(array, "_mmap", None) or getattr(array.base, "_mmap", None)
+        if mapping is not None and hasattr(mmap, "MADV_DONTNEED"):
+            mapping.madvise(mmap.MADV_DONTNEED)
+
+def map_volume(path, spill_dir, slab_size=DEFAULT_SLAB_SIZE):
+    """Open a scan file without loading it into memory
+
+    Raw (uncompressed) NRRD payloads are memory-mapped where they are. Other
+    formats are read slab by slab with SimpleITK's streaming reader into a
+    spill file; how little each read touches depends on the format's ImageIO.
+    """
+    reader = sitk.ImageFileReader()
+    reader.SetFileName(path)
+    reader.ReadImageInformation()
+    if reader.GetDimension() != 3 or reader.GetNumberOfComponents() != 1:
+        raise ValueError(f"Out-of-core mode needs a 3D scalar volume, got {path}")
+    
+    width, height, depth = reader.GetSize()
+    geometry = (reader.GetSpacing(), reader.GetOrigin(), reader.GetDirection())
+    
+    mapped = _map_raw_nrrd(path, (depth, height, width))
+    if mapped is not None:
+        log.info(f"Memory-mapped raw NRRD payload {mapped.shape}")
+        return MappedVolume(mapped, *geometry)
+    
+    array = None
+    for z0 in range(0, depth, slab_size):
+        z1 = min(z0 + slab_size, depth)
+        reader.SetExtractIndex([0, 0, z0])
+        reader.SetExtractSize([width, height, z1 - z0])
+        slab = reader.Execute()
+        if array is None:
+            array = spill_array(spill_dir, "volume", (depth, height, width), sitk.GetArrayViewFromImage(slab).dtype)
+        array[z0:z1] = sitk.GetArrayViewFromImage(slab)
+        release(array)
+    log.info(f"Streamed {path} into a spill file {array.shape}")
+    return MappedVolume(array, *geometry)
+
+def read_nrrd_header(path):
+    """(fields, payload offset) of a NRRD header, or None if the file is not one
+
+    Field names are lower-cased. With "data file: LIST" the file names that
+    follow it are returned as fields["data files"].
+    """
+    if not path.lower().endswith((".nrrd", ".nhdr")):
+        return None
+    
+    fields = {}
+    with open(path, 'rb') as f:
+        if not f.readline().startswith(b"NRRD"):
+            return None
+        for line in f:
+            line = line.decode("latin-1").rstrip("\r\n")
+            if "data files" in fields:
+                if line:
+                    fields["data files"].append(line)
+                continue
+            if not line:
+                break
+            if not line.startswith("#") and ": " in line:
+                key, value = line.split(": ", 1)
+                fields[key.strip().lower()] = value.strip()
+                if key.strip().lower() in ("data file", "datafile") and value.startswith("LIST"):
+                    fields["data files"] = []
+        offset = f.tell()
+    return fields, offset
+
+def nrrd_data_files(path):
+    """Paths of the detached data files a NRRD header points at ([] for attached data)"""
+    header = read_nrrd_header(path)
+    data_file = header and header[0].get("data file", header[0].get("datafile"))
+    if not data_file:
+        return []
+    
+    folder = os.path.dirname(path)
+    if "data files" in header[0]:
+        names = header[0]["data files"]
+    elif "%" in data_file:
+        # "<format> <min> <max> <step> [<subdim>]", min to max inclusive
+        pattern, first, last, step = data_file.split()[:4]
+        first, last, step = int(first), int(last), int(step)
+        names = [pattern % number for number in range(first, last + (1 if step > 0 else -1), step)]
+    else:
+        names = [data_file]
+    return [os.path.join(folder, name) for name in names]
+
+def _map_raw_nrrd(path, shape):
+    """np.memmap over a raw NRRD payload, or None if the file is not one"""
+    header = read_nrrd_header(path)
+    if header is None:
+        return None
+    fields, offset = header
+    
+    dtype = NRRD_TYPES.get(fields.get("type", "").lower())
+    if fields.get("encoding") != "raw" or dtype is None or fields.get("dimension") != "3":
+        return None
+    if int(fields.get("byte skip", 0)) != 0 or int(fields.get("line skip", 0)) != 0:
+        return None
+    
+    data_file = fields.get("data file", fields.get("datafile"))
+    if data_file is not None:
+        if data_file.startswith("LIST") or " " in data_file:
+            return None
+        path, offset = os.path.join(os.path.dirname(path), data_file), 0
+    
+    byte_order = ">" if fields.get("endian") == "big" else "<"
+    return np.memmap(path, dtype=np.dtype(byte_order + dtype), mode='r', offset=offset, shape=shape)
+
+def resolve_equivalences(count, pairs):
+    """Map each of count labels to the smallest label it is connected to by pairs"""
+    parent = np.arange(count)
+    if len(pairs) == 0:
+        return parent
+    
+    pairs = np.unique(pairs, axis=0)
+    while True:
+        # Pointer jumping until every label points straight at its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        
+        a, b = parent[pairs[:, 0]], parent[pairs[:, 1]]
+        differ = a != b
+        if not differ.any():
+            return parent
+        np.minimum.at(parent, np.maximum(a, b)[differ], np.minimum(a, b)[differ])
+
+def label_components(volume, binarize, labels, slab_size=DEFAULT_SLAB_SIZE, progress=None):
+    """Face-connected components of a mask computed slab by slab
+
+    binarize(slab_image) turns one slab of volume into a uint8 0/1 image.
+    Slabs are labelled with SimpleITK, their labels offset to be unique,
+    and labels touching across a slab seam are merged afterwards. Per-voxel
+    labels are written to the uint32 array labels. Returns (root, sizes):
+    root maps each label to its component's smallest label (raster order,
+    as SimpleITK numbers them) and sizes counts voxels per root label.
+    progress, if given, is called with the fraction of slabs done.
+    """
+    depth = volume.array.shape[0]
+    count = 0
+    voxel_counts = [np.zeros(1, dtype=np.int64)]
+    pairs = []
+    previous = None
+    
+    for z0 in range(0, depth, slab_size):
+        z1 = min(z0 + slab_size, depth)
+        components = sitk.ConnectedComponentImageFilter()
+        slab_labels = sitk.GetArrayFromImage(components.Execute(binarize(volume.slab(z0, z1)))).astype(np.uint32)
+        found = components.GetObjectCount()
+        
+        voxel_counts.append(np.bincount(slab_labels.ravel(), minlength=found + 1)[1:])
+        np.add(slab_labels, count, out=slab_labels, where=slab_labels > 0)
+        labels[z0:z1] = slab_labels
+        release(volume.array, labels)
+        
+        if previous is not None:
+            touching = (previous > 0) & (slab_labels[0] > 0)
+            pairs.append(np.stack([previous[touching], slab_labels[0][touching]], axis=1))
+        previous = slab_labels[-1].copy()
+        count += found
+        if progress:
+            progress(z1 / depth)
+    
+    pairs = np.concatenate(pairs).astype(np.int64) if pairs else np.zeros((0, 2), dtype=np.int64)
+    root = resolve_equivalences(count + 1, pairs)
+    sizes = np.bincount(root, weights=np.concatenate(voxel_counts), minlength=count + 1).astype(np.int64)
+    log.info(f"   {count:,} slab components merged into {np.count_nonzero(sizes[1:]):,}")
+    return root, sizes
+
+def bounding_box_of(mask):
+    """(x, y, z, size_x, size_y, size_z) of a z, y, x mask's nonzero voxels, or None"""
+    z = np.flatnonzero(mask.any(axis=(1, 2)))
+    if z.size == 0:
+        return None
+    occupied = mask[z[0]:z[-1] + 1]
+    y = np.flatnonzero(occupied.any(axis=(0, 2)))
+    x = np.flatnonzero(occupied.any(axis=(0, 1)))
+    return (int(x[0]), int(y[0]), int(z[0]),
+            int(x[-1] - x[0] + 1), int(y[-1] - y[0] + 1), int(z[-1] - z[0] + 1))
+
+def select_labels(labels, keep, mask, slab_size=DEFAULT_SLAB_SIZE, progress=None):
+    """Write mask = keep[labels] slab by slab; returns the kept voxels'
+    bounding_box_of(), or None if nothing is kept
+    """
+    low, high = None, None
+    for z0 in range(0, labels.shape[0], slab_size):
+        z1 = min(z0 + slab_size, labels.shape[0])
+        selected = keep[labels[z0:z1]]
+        mask[z0:z1] = selected
+        release(labels, mask)
+        
+        box = bounding_box_of(selected)
+        if box is not None:
+            slab_low = np.array(box[:3]) + (0, 0, z0)
+            slab_high = slab_low + box[3:] - 1
+            low = slab_low if low is None else np.minimum(low, slab_low)
+            high = slab_high if high is None else np.maximum(high, slab_high)
+        if progress:
+            progress(z1 / labels.shape[0])
+    
+    if low is None:
+        return None
+    return tuple(int(v) for v in low) + tuple(int(v) for v in high - low + 1)
+
+def median_slabs(mask, index, size, out, slab_size=DEFAULT_SLAB_SIZE, progress=None):
+    """Radius-1 binary median of the region (index, size) of mask, into out
+
+    Each slab is filtered with one halo slice on either side (clipped to the
+    region), so the result matches filtering the cropped region in one go.
+    """
+    x0, y0, z_start = index
+    width, height, depth = size
+    z_end = z_start + depth
+    
+    for z0 in range(z_start, z_end, slab_size):
+        z1 = min(z0 + slab_size, z_end)
+        h0, h1 = max(z0 - 1, z_start), min(z1 + 1, z_end)
+        block = sitk.GetImageFromArray(np.ascontiguousarray(mask[h0:h1, y0:y0 + height, x0:x0 + width]))
+        
+        smoother = sitk.BinaryMedianImageFilter()
+        smoother.SetRadius([1, 1, 1])
+        filtered = smoother.Execute(block)
+        out[z0 - z_start:z1 - z_start] = sitk.GetArrayViewFromImage(filtered)[z0 - h0:z1 - h0]
+        release(mask, out)
+        if progress:
+            progress((z1 - z_start) / depth)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+On-disk, content-addressed cache for MedicalTo3D stage results
+Volumes are stored as uncompressed NRRD (raw payload, memory-mappable),
+meshes as VTK XML PolyData, with least-recently-used size eviction
+"""
+
+import hashlib
+import json
+import os
+import SimpleITK as sitk
+
+from slab_stream import nrrd_data_files
+
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+ARTEFACT_EXTENSIONS = {"image": ".nrrd", "mesh": ".vtp", "meta": ".json"}
+
+def files_digest(paths):
+    """Digest of a set of input files from their absolute paths, sizes and mtimes.
+
+    Cheap enough for thousands of DICOM slices on a network share, and any
+    rewrite of a file changes its size or mtime. Same-named files in two
+    folders (copied with their mtimes) still differ by path, and a detached
+    NRRD header brings in the data files it points at.
+    """
+    paths = [os.path.realpath(path) for path in paths]
+    paths += [os.path.realpath(data) for path in paths for data in nrrd_data_files(path)]
+    digest = hashlib.sha256()
+    for path in sorted(set(paths)):
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def image_digest(image):
+    """Digest of a SimpleITK image's pixels and geometry"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([image.GetPixelIDTypeAsString(), image.GetSize(), image.GetSpacing(),
+                              image.GetOrigin(), image.GetDirection()]).encode())
+    digest.update(memoryview(sitk.GetArrayViewFromImage(image)).cast('B'))
+    return digest.hexdigest()
+
+class StageCache:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+    
+    def key(self, stage, upstream, **params):
+        """Key for a stage result: the stage name, its input's key and its parameters"""
+        payload = json.dumps({"stage": stage, "upstream": upstream, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def has(self, key, kind):
+        """Whether an artefact is cached; a hit counts as a use for LRU eviction"""
+        path = self._path(key, kind)
+        if not os.path.exists(path):
+            return False
+        os.utime(path)
+        return True
+    
+    def load_image(self, key):
+        return sitk.ReadImage(self._touch(key, "image"))
+    
+    def save_image(self, key, image):
+        self._save(key, "image", lambda path: sitk.WriteImage(image, path, useCompression=False))
+    
+    def load_mesh(self, key):
+        from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+        
+        reader = vtkXMLPolyDataReader()
+        reader.SetFileName(self._touch(key, "mesh"))
+        reader.Update()
+        return reader.GetOutput()
+    
+    def save_mesh(self, key, mesh):
+        from vtkmodules.vtkIOXML import vtkXMLPolyDataWriter
+        
+        def write(path):
+            writer = vtkXMLPolyDataWriter()
+            writer.SetFileName(path)
+            writer.SetInputData(mesh)
+            writer.SetDataModeToAppended()
+            writer.EncodeAppendedDataOff()
+            writer.Write()
+        self._save(key, "mesh", write)
+    
+    def load_meta(self, key):
+        with open(self._touch(key, "meta")) as f:
+            return json.load(f)
+    
+    def save_meta(self, key, meta):
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump(meta, f)
+        self._save(key, "meta", write)
+    
+    def size(self):
+        return sum(os.path.getsize(path) for path in self._entries())
+    
+    def evict(self):
+        """Delete least-recently-used artefacts until the cache fits max_bytes"""
+        entries = sorted(self._entries(), key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in entries)
+        
+        for path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+    
+    def _path(self, key, kind):
+        return os.path.join(self.root, key[:2], key + ARTEFACT_EXTENSIONS[kind])
+    
+    def _touch(self, key, kind):
+        """Path of an artefact, marked as just used for LRU eviction"""
+        path = self._path(key, kind)
+        os.utime(path)
+        return path
+    
+    def _save(self, key, kind, write):
+        path = self._path(key, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Write under a temporary name so readers never see a partial file
+        base, extension = os.path.splitext(path)
+        temporary = f"{base}.{os.getpid()}.tmp{extension}"
+        write(temporary)
+        os.replace(temporary, path)
+        self.evict()
+    
+    def _entries(self):
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if '.tmp' not in name:
+                    yield os.path.join(directory, name)
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 """
 Medical 3D Pipeline Starter
-Choose how you want to run the pipeline
+Choose how you want to run the pipeline; the choice runs in this process,
+importing only what it needs
 """
 
-import sys
-import os
+import code
 
 def main():
     print("🏥 Medical 3D Pipeline")
@@ -22,19 +22,20 @@ def main():
     
     if choice == "1":
         print("\n🧪 Running pipeline test...")
-        os.system("python test_pipeline.py")
+        from test_pipeline import test_pipeline
+        test_pipeline()
         
     elif choice == "2":
         print("\n🌐 Starting web API server...")
         print("The server will start on http://localhost:5000")
         print("Press Ctrl+C to stop")
-        # Note: API server file will be created separately
-        print("❌ API server not yet created - run the full setup first")
+        import api_server
+        api_server.main()
         
     elif choice == "3":
         print("\n🐍 Starting interactive session...")
-        print("Import the pipeline with: from med_pipeline import MedicalTo3D")
-        os.system("python -i -c 'from med_pipeline import MedicalTo3D; print(\"Pipeline ready!\")'")
+        from med_pipeline import MedicalTo3D
+        code.interact(banner="Pipeline ready! MedicalTo3D is imported.", local={"MedicalTo3D": MedicalTo3D})
         
     elif choice == "4":
         print("👋 Goodbye!")
@@ -1,39 +1,90 @@
 #!/usr/bin/env python3
-import vtk
 import json
 import base64
-import struct
+import io
 import os
+import struct
 import numpy as np
 
-def stl_to_gltf(stl_path, gltf_path, color=[0.8, 0.8, 0.9]):
-    print(f"Converting {stl_path} → {gltf_path}")
+from profiling import log
+
+GLB_MAGIC = 0x46546C67
+GLB_CHUNK_JSON = 0x4E4F534A
+GLB_CHUNK_BIN = 0x004E4942
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+def stl_to_gltf(stl_path, gltf_path, color=[0.8, 0.8, 0.9], quantize=False):
+    from vtkmodules.vtkIOGeometry import vtkSTLReader
+    
+    log.info(f"Converting {stl_path} → {gltf_path}")
     
-    reader = vtk.vtkSTLReader()
+    reader = vtkSTLReader()
     reader.SetFileName(stl_path)
     reader.Update()
     
-    mesh = reader.GetOutput()
-    points = mesh.GetPoints()
-    polys = mesh.GetPolys()
+    vertex_count = polydata_to_gltf(reader.GetOutput(), gltf_path, color, quantize=quantize)
     
-    vertices = []
-    for i in range(points.GetNumberOfPoints()):
-        point = points.GetPoint(i)
-        vertices.extend([point[0], point[1], point[2]])
+    log.info(f"✅ Done: {vertex_count:,} vertices")
+
+def polydata_to_gltf(mesh, gltf_path, color=[0.8, 0.8, 0.9], embed_data=True, quantize=False):
+    """Write a vtkPolyData straight to .gltf or .glb (chosen by extension).
+
+    Points, point normals and triangles are taken as NumPy views of the VTK
+    arrays where the types allow it. Normals are recomputed only when the
+    mesh carries none. Returns the number of vertices written.
+    """
+    from vtkmodules.util import numpy_support
     
-    indices = []
-    polys.InitTraversal()
-    idList = vtk.vtkIdList()
-    while polys.GetNextCell(idList):
-        if idList.GetNumberOfIds() == 3:
-            indices.extend([idList.GetId(0), idList.GetId(1), idList.GetId(2)])
+    vertices, indices = polydata_to_arrays(mesh)
     
-    normals = compute_normals(vertices, indices)
+    normals = mesh.GetPointData().GetNormals()
+    if normals is not None:
+        normals = numpy_support.vtk_to_numpy(normals).reshape(-1, 3)
+    else:
+        normals = compute_normals(vertices, indices)
     
-    vertex_data = struct.pack(f'{len(vertices)}f', *vertices)
-    normal_data = struct.pack(f'{len(normals)}f', *normals)
-    index_data = struct.pack(f'{len(indices)}I', *indices)
+    if gltf_path.endswith('.glb'):
+        write_glb(gltf_path, vertices, normals, indices, color, quantize=quantize)
+    else:
+        write_gltf(gltf_path, vertices, normals, indices, color, embed_data, quantize=quantize)
+    
+    return len(vertices)
+
+def write_gltf(gltf_path, vertices, normals, indices, color=[0.8, 0.8, 0.9], embed_data=True, quantize=False):
+    """Write a JSON glTF.
+
+    With embed_data the buffers are base64 data URIs inside the JSON;
+    otherwise they go to a single interleaved .bin file next to it, laid out
+    like the GLB binary chunk. quantize implies the single-buffer layout.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+    normals = np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+    indices = np.ascontiguousarray(indices, dtype=np.uint32).ravel()
+    if not len(vertices):
+        raise ValueError(f"Cannot write {gltf_path}: the mesh has no vertices (was everything segmented away?)")
+    
+    if quantize or not embed_data:
+        gltf, columns, index_arrays = _pack_geometry(vertices, normals, indices, color, quantize)
+        
+        if embed_data:
+            with io.BytesIO() as buffer:
+                _write_interleaved(buffer, columns, index_arrays)
+                data = buffer.getvalue()
+            gltf["buffers"][0]["uri"] = "data:application/octet-stream;base64," + base64.b64encode(data).decode()
+        else:
+            bin_path = os.path.splitext(gltf_path)[0] + '.bin'
+            gltf["buffers"][0]["uri"] = os.path.basename(bin_path)
+            with open(bin_path, 'wb') as f:
+                _write_interleaved(f, columns, index_arrays)
+        
+        with open(gltf_path, 'w') as f:
+            json.dump(gltf, f, separators=(',', ':'))
+        return gltf_path
+    
+    vertex_data = vertices.tobytes()
+    normal_data = normals.tobytes()
+    index_data = indices.tobytes()
     
     gltf = {
         "asset": {"version": "2.0"},
@@ -41,11 +92,11 @@ def stl_to_gltf(stl_path, gltf_path, color=[0.8, 0.8, 0.9]):
         "scenes": [{"nodes": [0]}],
         "nodes": [{"mesh": 0}],
         "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "NORMAL": 1}, "indices": 2, "material": 0}]}],
-        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": color + [1.0], "metallicFactor": 0.1, "roughnessFactor": 0.8}}],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": list(color) + [1.0], "metallicFactor": 0.1, "roughnessFactor": 0.8}}],
         "accessors": [
-            {"bufferView": 0, "componentType": 5126, "count": len(vertices) // 3, "type": "VEC3", "min": [min(vertices[i::3]) for i in range(3)], "max": [max(vertices[i::3]) for i in range(3)]},
-            {"bufferView": 1, "componentType": 5126, "count": len(normals) // 3, "type": "VEC3"},
-            {"bufferView": 2, "componentType": 5125, "count": len(indices), "type": "SCALAR"}
+            {"bufferView": 0, "componentType": 5126, "count": len(vertices), "type": "VEC3", "min": vertices.min(axis=0).tolist(), "max": vertices.max(axis=0).tolist()},
+            {"bufferView": 1, "componentType": 5126, "count": len(normals), "type": "VEC3"},
+            {"bufferView": 2, "componentType": 5125, "count": indices.size, "type": "SCALAR"}
         ],
         "bufferViews": [
             {"buffer": 0, "byteLength": len(vertex_data)},
@@ -62,42 +113,351 @@ def stl_to_gltf(stl_path, gltf_path, color=[0.8, 0.8, 0.9]):
     with open(gltf_path, 'w') as f:
         json.dump(gltf, f, indent=2)
     
-    print(f"✅ Done: {len(vertices)//3:,} vertices")
+    return gltf_path
+
+def write_glb(glb_path, vertices, normals, indices, color=[0.8, 0.8, 0.9], block_size=1 << 20, quantize=False):
+    """Write a binary glTF (.glb) with a single 4-byte aligned buffer.
 
-def compute_normals(vertices, indices):
-    normals = [0.0] * len(vertices)
+    POSITION and NORMAL are interleaved in one bufferView (byteStride 24, or
+    12 when quantized), followed by the index bufferView. Vertex data is
+    streamed to disk in blocks of block_size vertices so the payload is
+    never held in memory as one bytes object.
+    """
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+    normals = np.ascontiguousarray(normals, dtype=np.float32).reshape(-1, 3)
+    indices = np.ascontiguousarray(indices, dtype=np.uint32).ravel()
+    if not len(vertices):
+        raise ValueError(f"Cannot write {glb_path}: the mesh has no vertices (was everything segmented away?)")
+    
+    gltf, columns, index_arrays = _pack_geometry(vertices, normals, indices, color, quantize)
+    bin_length = gltf["buffers"][0]["byteLength"]
+    
+    json_chunk = json.dumps(gltf, separators=(',', ':')).encode()
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    bin_padding = -bin_length % 4
+    total_length = 12 + 8 + len(json_chunk) + 8 + bin_length + bin_padding
+    
+    with open(glb_path, 'wb') as f:
+        f.write(struct.pack('<III', GLB_MAGIC, 2, total_length))
+        f.write(struct.pack('<II', len(json_chunk), GLB_CHUNK_JSON))
+        f.write(json_chunk)
+        f.write(struct.pack('<II', bin_length + bin_padding, GLB_CHUNK_BIN))
+        _write_interleaved(f, columns, index_arrays, block_size)
+        f.write(b'\0' * bin_padding)
     
-    for i in range(0, len(indices), 3):
-        i0, i1, i2 = indices[i], indices[i+1], indices[i+2]
+    return glb_path
+
+def _pack_geometry(vertices, normals, indices, color, quantize=False):
+    """Lay out one buffer: interleaved POSITION/NORMAL, then the indices.
+
+    Returns (gltf_json, vertex_columns, index_arrays) where vertex_columns
+    are the per-vertex arrays to interleave, in order, and index_arrays hold
+    one index array per primitive.
+    """
+    node = {"mesh": 0}
+    extensions = []
+    
+    if quantize:
+        raw_bytes = 24 * len(vertices) + 4 * indices.size
+        vertices, normals, indices = optimize_mesh(vertices, normals, indices)
+        order, primitives = split_primitives(indices)
+        vertices, normals = vertices[order], normals[order]
+        positions, encoded_normals, translation, scale, report = quantize_geometry(vertices, normals)
         
-        v0 = np.array([vertices[i0*3], vertices[i0*3+1], vertices[i0*3+2]])
-        v1 = np.array([vertices[i1*3], vertices[i1*3+1], vertices[i1*3+2]])
-        v2 = np.array([vertices[i2*3], vertices[i2*3+1], vertices[i2*3+2]])
+        columns = [positions, encoded_normals]
+        position_accessor = {"componentType": 5122, "normalized": True}
+        normal_accessor = {"componentType": 5120, "normalized": True}
+        position_bounds = positions[:, :3]
+        node.update({"translation": translation, "scale": [scale] * 3})
+        extensions = ["KHR_mesh_quantization"]
+    else:
+        columns = [vertices, normals]
+        position_accessor = {"componentType": 5126}
+        normal_accessor = {"componentType": 5126}
+        position_bounds = vertices
+        primitives = [(0, len(vertices), indices)]
+    
+    stride = sum(column.itemsize * column.shape[1] for column in columns)
+    vertex_bytes = stride * len(vertices)
+    normal_offset = columns[0].itemsize * columns[0].shape[1]
+    
+    accessors = []
+    mesh_primitives = []
+    index_arrays = []
+    index_bytes = 0
+    for first_vertex, vertex_count, primitive_indices in primitives:
+        bounds = position_bounds[first_vertex:first_vertex + vertex_count]
+        index_type = 5123 if primitive_indices.dtype == np.uint16 else 5125
+        mesh_primitives.append({"attributes": {"POSITION": len(accessors), "NORMAL": len(accessors) + 1}, "indices": len(accessors) + 2, "material": 0})
+        accessors += [
+            {"bufferView": 0, "byteOffset": first_vertex * stride, "count": vertex_count, "type": "VEC3", **position_accessor, "min": bounds.min(axis=0).tolist(), "max": bounds.max(axis=0).tolist()},
+            {"bufferView": 0, "byteOffset": first_vertex * stride + normal_offset, "count": vertex_count, "type": "VEC3", **normal_accessor},
+            {"bufferView": 1, "byteOffset": index_bytes, "componentType": index_type, "count": primitive_indices.size, "type": "SCALAR"}
+        ]
+        index_arrays.append(primitive_indices)
+        index_bytes += primitive_indices.nbytes + (-primitive_indices.nbytes % 4)
+    
+    gltf = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [node],
+        "meshes": [{"primitives": mesh_primitives}],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": list(color) + [1.0], "metallicFactor": 0.1, "roughnessFactor": 0.8}}],
+        "accessors": accessors,
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": vertex_bytes, "byteStride": stride, "target": ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": vertex_bytes, "byteLength": index_bytes, "target": ELEMENT_ARRAY_BUFFER}
+        ],
+        "buffers": [{"byteLength": vertex_bytes + index_bytes}]
+    }
+    
+    if extensions:
+        gltf["extensionsUsed"] = extensions
+        gltf["extensionsRequired"] = extensions
+        report.update({"raw_bytes": raw_bytes, "packed_bytes": vertex_bytes + index_bytes,
+                       "primitives": len(primitives)})
+        print_quantization_report(report)
+    
+    return gltf, columns, index_arrays
+
+def _write_interleaved(f, columns, index_arrays, block_size=1 << 20):
+    columns = [column.view(np.uint8) for column in columns]
+    vertex_count = len(columns[0])
+    stride = sum(column.shape[1] for column in columns)
+    
+    block = np.empty((min(block_size, vertex_count), stride), dtype=np.uint8)
+    for start in range(0, vertex_count, block_size):
+        stop = min(start + block_size, vertex_count)
+        view = block[:stop - start]
+        offset = 0
+        for column in columns:
+            view[:, offset:offset + column.shape[1]] = column[start:stop]
+            offset += column.shape[1]
+        f.write(memoryview(view))
+    
+    for indices in index_arrays:
+        f.write(memoryview(indices))
+        f.write(b'\0' * (-indices.nbytes % 4))
+
+def read_glb(glb_path):
+    """Read a .glb written by write_glb, returning (gltf_json, bin_chunk_bytes)"""
+    with open(glb_path, 'rb') as f:
+        magic, version, total_length = struct.unpack('<III', f.read(12))
+        if magic != GLB_MAGIC or version != 2:
+            raise ValueError(f"{glb_path} is not a glTF 2.0 binary file")
         
-        normal = np.cross(v1 - v0, v2 - v0)
-        length = np.linalg.norm(normal)
-        if length > 0:
-            normal /= length
+        json_length, chunk_type = struct.unpack('<II', f.read(8))
+        gltf = json.loads(f.read(json_length))
         
-        for idx in [i0, i1, i2]:
-            normals[idx*3] += normal[0]
-            normals[idx*3+1] += normal[1]
-            normals[idx*3+2] += normal[2]
+        binary = b''
+        if f.tell() < total_length:
+            bin_length, chunk_type = struct.unpack('<II', f.read(8))
+            binary = f.read(bin_length)
     
-    for i in range(0, len(normals), 3):
-        length = (normals[i]**2 + normals[i+1]**2 + normals[i+2]**2)**0.5
-        if length > 0:
-            normals[i] /= length
-            normals[i+1] /= length
-            normals[i+2] /= length
+    return gltf, binary
+
+def polydata_to_arrays(mesh):
+    """Return (vertices, indices) of a vtkPolyData as float32 (N, 3) and uint32 (M, 3) arrays.
+
+    Only triangle cells are kept, matching what glTF TRIANGLES primitives can hold.
+    """
+    from vtkmodules.util import numpy_support
+    
+    # An empty filter output may have no vtkPoints at all
+    points = mesh.GetPoints()
+    if points is None:
+        return np.empty((0, 3), dtype=np.float32), np.empty((0, 3), dtype=np.uint32)
+    vertices = numpy_support.vtk_to_numpy(points.GetData())
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, 3)
+    
+    polys = mesh.GetPolys()
+    offsets = numpy_support.vtk_to_numpy(polys.GetOffsetsArray())
+    connectivity = numpy_support.vtk_to_numpy(polys.GetConnectivityArray())
+    
+    sizes = np.diff(offsets)
+    if sizes.size and np.all(sizes == 3):
+        triangles = connectivity.reshape(-1, 3)
+    else:
+        starts = offsets[:-1][sizes == 3]
+        triangles = connectivity[starts[:, None] + np.arange(3)]
+    
+    indices = np.ascontiguousarray(triangles, dtype=np.uint32).reshape(-1, 3)
+    return vertices, indices
+
+def arrays_to_polydata(vertices, indices):
+    """Build a triangle vtkPolyData from (N, 3) points and (M, 3) indices"""
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkCommonCore import vtkPoints
+    from vtkmodules.vtkCommonDataModel import vtkCellArray, vtkPolyData
+    
+    points = vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(np.ascontiguousarray(vertices, dtype=np.float32), deep=True))
+    
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    offsets = np.arange(0, triangles.size + 1, 3, dtype=np.int64)
+    polys = vtkCellArray()
+    polys.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                  numpy_support.numpy_to_vtkIdTypeArray(triangles.ravel(), deep=True))
+    
+    mesh = vtkPolyData()
+    mesh.SetPoints(points)
+    mesh.SetPolys(polys)
+    return mesh
+
+def compute_normals(vertices, indices, area_weighted=False):
+    """Per-vertex normals as a float32 (N, 3) array.
+
+    Each vertex accumulates the normals of the triangles that use it. With
+    area_weighted=False every face contributes its unit normal; with
+    area_weighted=True larger faces pull proportionally harder.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    indices = np.asarray(indices, dtype=np.intp).reshape(-1, 3)
+    
+    v0 = vertices[indices[:, 0]]
+    face_normals = np.cross(vertices[indices[:, 1]] - v0, vertices[indices[:, 2]] - v0)
+    
+    if not area_weighted:
+        lengths = np.linalg.norm(face_normals, axis=1, keepdims=True)
+        np.divide(face_normals, lengths, out=face_normals, where=lengths > 0)
+    
+    normals = np.zeros_like(vertices)
+    flat = indices.ravel()
+    for axis in range(3):
+        normals[:, axis] = np.bincount(flat, weights=np.repeat(face_normals[:, axis], 3),
+                                       minlength=len(vertices))
+    
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    
+    return normals.astype(np.float32)
+
+def optimize_mesh(vertices, normals, indices):
+    """Reorder triangles and vertices for GPU cache locality.
+
+    Triangles are sorted along a Morton (Z-order) curve of their centroids,
+    so consecutive triangles share vertices, then vertices are renumbered in
+    first-use order so fetches walk the vertex buffer forwards. Vertices no
+    triangle references are dropped.
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return vertices, normals, indices
+    
+    centroids = vertices[triangles].mean(axis=1)
+    low = centroids.min(axis=0)
+    extent = np.maximum(centroids.max(axis=0) - low, 1e-12)
+    cells = ((centroids - low) / extent * 1023).astype(np.uint64)
+    triangles = triangles[np.argsort(_morton_code(cells), kind='stable')]
+    
+    used, first_use = np.unique(triangles.ravel(), return_index=True)
+    order = used[np.argsort(first_use)]
+    remap = np.empty(len(vertices), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+    
+    return vertices[order], normals[order], remap[triangles].ravel()
+
+def _morton_code(cells):
+    """Interleave the low 10 bits of each column of a (N, 3) uint64 array"""
+    code = np.zeros(len(cells), dtype=np.uint64)
+    for bit in range(10):
+        for axis in range(3):
+            code |= ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return code
+
+def quantize_geometry(vertices, normals):
+    """Quantize positions to normalized int16 and normals to normalized int8.
+
+    Positions are mapped into [-1, 1] around the bounding box centre using a
+    single scale for all three axes, so the node transform that restores them
+    is uniform and leaves normals untouched. Both attributes are padded to
+    four components to keep each vertex element 4-byte aligned.
+    
+    Returns (positions, normals, translation, scale, report) where report
+    holds the raw/quantized sizes and the worst position and normal error.
+    """
+    low = vertices.min(axis=0).astype(np.float64)
+    high = vertices.max(axis=0).astype(np.float64)
+    center = (low + high) / 2
+    scale = max(float((high - low).max()) / 2, 1e-12)
+    
+    positions = np.zeros((len(vertices), 4), dtype=np.int16)
+    positions[:, :3] = np.round((vertices - center) / scale * 32767)
+    
+    encoded_normals = np.zeros((len(normals), 4), dtype=np.int8)
+    encoded_normals[:, :3] = np.round(np.clip(normals, -1, 1) * 127)
     
-    return normals
+    decoded = positions[:, :3] / 32767.0 * scale + center
+    position_error = np.linalg.norm(decoded - vertices, axis=1)
+    
+    decoded_normals = encoded_normals[:, :3] / 127.0
+    lengths = np.linalg.norm(decoded_normals, axis=1)
+    cosines = np.einsum('ij,ij->i', decoded_normals, normals) / np.where(lengths > 0, lengths, 1)
+    valid = np.linalg.norm(normals, axis=1) > 0
+    normal_error = np.degrees(np.arccos(np.clip(cosines[valid], -1, 1)))
+    
+    report = {
+        "raw_vertex_bytes": 24 * len(vertices),
+        "quantized_vertex_bytes": 12 * len(vertices),
+        "max_position_error": float(position_error.max()) if len(vertices) else 0.0,
+        "max_normal_error_degrees": float(normal_error.max()) if normal_error.size else 0.0,
+    }
+    return positions, encoded_normals, center.tolist(), scale, report
+
+def split_primitives(indices, max_vertices=0xFFFF):
+    """Split a triangle list into primitives small enough for uint16 indices.
+
+    Triangles are taken in their current order (run optimize_mesh first so
+    each run is spatially compact). Every primitive gets its own contiguous
+    vertex range, in first-use order; vertices on a seam between two
+    primitives are duplicated. Returns (vertex_order, primitives) where
+    vertex_order gathers the new vertex buffer from the old one and each
+    primitive is (first_vertex, vertex_count, local_indices).
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    # 0xFFFF itself is the uint16 primitive-restart value, which glTF forbids
+    limit = max_vertices - 1
+    
+    orders = []
+    primitives = []
+    first_vertex = 0
+    start = 0
+    step = 2 * limit
+    while start < len(triangles) or not primitives:
+        stop = min(start + step, len(triangles))
+        used, local = np.unique(triangles[start:stop], return_inverse=True)
+        if len(used) > limit and stop - start > 1:
+            step = max(1, int((stop - start) * limit / len(used) * 0.95))
+            continue
+        
+        local = local.ravel()
+        first_use = np.full(len(used), len(local), dtype=np.int64)
+        np.minimum.at(first_use, local, np.arange(len(local)))
+        rank = np.empty(len(used), dtype=np.int64)
+        rank[np.argsort(first_use, kind='stable')] = np.arange(len(used))
+        
+        dtype = np.uint16 if len(used) <= limit else np.uint32
+        orders.append(used[np.argsort(first_use, kind='stable')])
+        primitives.append((first_vertex, len(used), rank[local].astype(dtype)))
+        first_vertex += len(used)
+        start = stop
+        step = max(step, 2 * limit)
+    
+    return np.concatenate(orders), primitives
+
+def print_quantization_report(report):
+    raw, packed = report["raw_bytes"], report["packed_bytes"]
+    log.info(f"   📦 Geometry: {raw / 1024:,.0f} KB → {packed / 1024:,.0f} KB "
+             f"({100 * (1 - packed / max(raw, 1)):.0f}% smaller, {report['primitives']} primitives)")
+    log.info(f"   📏 Max error: {report['max_position_error']:.4f} position units, "
+             f"{report['max_normal_error_degrees']:.2f}° normals")
 
 def convert_all_models():
     models = [
-        ("outputs/skull_model.stl", "outputs/skull.gltf", [0.95, 0.95, 0.85]),
-        ("outputs/brain_tissue.stl", "outputs/brain.gltf", [0.83, 0.65, 0.65]),
-        ("outputs/vessels.stl", "outputs/vessels.gltf", [0.8, 0.2, 0.2])
+        ("outputs/skull_model.stl", "outputs/skull.glb", [0.95, 0.95, 0.85]),
+        ("outputs/brain_tissue.stl", "outputs/brain.glb", [0.83, 0.65, 0.65]),
+        ("outputs/vessels.stl", "outputs/vessels.glb", [0.8, 0.2, 0.2])
     ]
     
     print("🔄 Converting STL to GLTF...")
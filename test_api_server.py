@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test the conversion API and model serving with Flask's test client
+"""
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import SimpleITK as sitk
+
+from api_server import compressed_copy, create_app
+from test_med_pipeline import make_ball_ct, write_dicom_series
+
+def test_model_serving():
+    print("🧪 Serving a model with caching headers...")
+    with tempfile.TemporaryDirectory() as tmp:
+        payload = bytes(range(256)) * 64
+        with open(os.path.join(tmp, "skull.glb"), 'wb') as f:
+            f.write(payload)
+        client = create_app(tmp, tmp, executor=ThreadPoolExecutor(1)).test_client()
+        
+        response = client.get("/outputs/skull.glb")
+        assert response.status_code == 200 and response.data == payload
+        assert response.mimetype == "model/gltf-binary"
+        assert "no-cache" in response.headers["Cache-Control"]
+        etag = response.headers["ETag"]
+        
+        assert client.get("/outputs/skull.glb", headers={"If-None-Match": etag}).status_code == 304
+        
+        compressed = client.get("/outputs/skull.glb", headers={"Accept-Encoding": "gzip"})
+        assert compressed.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in compressed.headers["Vary"]
+        assert compressed.headers["ETag"] != etag
+        assert gzip.decompress(compressed.data) == payload
+        
+        partial = client.get("/outputs/skull.glb", headers={"Range": "bytes=100-199", "Accept-Encoding": "gzip"})
+        assert partial.status_code == 206 and partial.data == payload[100:200]
+        assert "Content-Encoding" not in partial.headers
+        
+        assert client.get("/outputs/../skull.glb").status_code == 404
+        assert client.get("/outputs/missing.glb").status_code == 404
+
+def test_concurrent_compression():
+    print("🧪 Compressing one model for concurrent requests...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "skull.glb")
+        payload = bytes(range(256)) * 4096
+        with open(path, 'wb') as f:
+            f.write(payload)
+        
+        # Every request finds no copy yet and writes its own at the same time
+        barrier = threading.Barrier(8)
+        
+        def compress(data):
+            barrier.wait()
+            return gzip.compress(data)
+        
+        with ThreadPoolExecutor(8) as executor:
+            targets = list(executor.map(lambda _: compressed_copy(path, ".gz", compress), range(8)))
+        assert set(targets) == {path + ".gz"}
+        with open(path + ".gz", 'rb') as f:
+            assert gzip.decompress(f.read()) == payload
+        assert sorted(os.listdir(tmp)) == ["skull.glb", "skull.glb.gz"]
+
+def test_conversion_job():
+    print("🧪 Converting a study through the API...")
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root, output_root = os.path.join(tmp, "data"), os.path.join(tmp, "out")
+        os.makedirs(data_root)
+        sitk.WriteImage(make_ball_ct(size=24, radius=8), os.path.join(data_root, "ball.nrrd"))
+        client = create_app(data_root, output_root, executor=ThreadPoolExecutor(1)).test_client()
+        
+        request = {"study": "ball.nrrd", "recipe": {"smoothing_iterations": 0}}
+        job = client.post("/api/jobs", json=request).get_json()
+        # Identical requests share the job
+        assert client.post("/api/jobs", json=request).get_json()["id"] == job["id"]
+        
+        # The event stream runs until the job finishes
+        stream = client.get(job["events"])
+        assert stream.mimetype == "text/event-stream"
+        events = [json.loads(line[len("data: "):]) for line in stream.get_data(as_text=True).splitlines()
+                  if line.startswith("data: ")]
+        progress = [event for event in events if event["type"] == "progress"]
+        assert {"generate_mesh", "export_gltf"} <= {event["stage"] for event in progress}
+        assert any(event["step"] == "median filter" and 0 < event["progress"] < 1 for event in progress)
+        assert events[-1]["type"] == "status" and events[-1]["status"] == "done", events[-1]
+        
+        job = client.get(job["url"]).get_json()
+        assert job["status"] == "done", job
+        # A finished job's stream is just its final status
+        assert client.get(job["events"]).get_data(as_text=True).count("event: ") == 1
+        
+        model = client.get(job["models"][0])
+        assert model.status_code == 200 and model.data[:4] == b"glTF"
+        assert "immutable" in model.headers["Cache-Control"]
+        
+        # A study replaced at the same path is a new job with new model URLs
+        sitk.WriteImage(make_ball_ct(size=24, radius=6), os.path.join(data_root, "ball.nrrd"))
+        os.utime(os.path.join(data_root, "ball.nrrd"), ns=(0, 0))
+        replaced = client.post("/api/jobs", json=request).get_json()
+        assert replaced["id"] != job["id"] and replaced["status"] != "done"
+        client.get(replaced["events"]).get_data()
+        assert client.get(replaced["url"]).get_json()["status"] == "done"
+        
+        assert client.post("/api/jobs", json={"study": "missing.nrrd"}).status_code == 404
+        assert client.post("/api/jobs", json={"study": "../ball.nrrd"}).status_code == 404
+        assert client.post("/api/jobs", json={"study": "ball.nrrd", "recipe": {"outputs": ["obj"]}}).status_code == 400
+        assert client.get("/api/jobs/unknown").status_code == 404
+        assert client.get("/api/jobs/unknown/events").status_code == 404
+
+def test_dicom_job_is_shared():
+    print("🧪 Resubmitting a converted DICOM study...")
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root, output_root = os.path.join(tmp, "data"), os.path.join(tmp, "out")
+        write_dicom_series(os.path.join(data_root, "study"), sitk.Cast(make_ball_ct(size=24, radius=8), sitk.sitkInt16),
+                           "1.2.3.4")
+        client = create_app(data_root, output_root, executor=ThreadPoolExecutor(1)).test_client()
+        
+        request = {"study": "study", "recipe": {"smoothing_iterations": 0}}
+        job = client.post("/api/jobs", json=request).get_json()
+        client.get(job["events"]).get_data()
+        assert client.get(job["url"]).get_json()["status"] == "done"
+        
+        # The DICOM index the job wrote into the study is not part of its fingerprint
+        assert os.path.exists(os.path.join(data_root, "study", ".dicom_index.json"))
+        again = client.post("/api/jobs", json=request).get_json()
+        assert again["id"] == job["id"] and again["status"] == "done"
+
+if __name__ == "__main__":
+    test_model_serving()
+    test_concurrent_compression()
+    test_conversion_job()
+    test_dicom_job_is_shared()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test the batch CLI on a directory of synthetic NRRD studies
+"""
+
+import json
+import os
+import tempfile
+import SimpleITK as sitk
+
+from batch_process import load_recipe, process_study, run_batch
+from test_med_pipeline import make_ball_ct
+
+def test_batch_resumes_and_isolates_failures():
+    print("🧪 Running a batch twice...")
+    with tempfile.TemporaryDirectory() as tmp:
+        studies = os.path.join(tmp, "studies")
+        os.makedirs(studies)
+        sitk.WriteImage(make_ball_ct(size=24, radius=8), os.path.join(studies, "ball.nrrd"))
+        sitk.WriteImage(make_ball_ct(size=32, radius=12), os.path.join(studies, "big_ball.nrrd"))
+        with open(os.path.join(studies, "broken.nrrd"), 'w') as f:
+            f.write("NRRD0004\ntruncated")
+        
+        recipe = load_recipe()
+        recipe.update(smoothing_iterations=0, outputs=["glb", "stl"])
+        output_dir = os.path.join(tmp, "out")
+        
+        summary = run_batch(studies, output_dir, recipe, workers=2)
+        assert summary["processed"] == 2 and summary["skipped"] == 0
+        assert list(summary["failed"]) == ["broken"]
+        assert {"load_nrrd", "preprocess_ct", "segment_threshold", "generate_mesh",
+                "export_gltf", "export_stl"} <= set(summary["stages"])
+        assert os.path.exists(os.path.join(output_dir, "ball", "profile.json"))
+        assert os.path.exists(os.path.join(output_dir, "ball", "ball.glb"))
+        with open(os.path.join(output_dir, "batch_summary.json")) as f:
+            assert json.load(f)["processed"] == 2
+        
+        # Finished studies are skipped; only the failed one is retried
+        summary = run_batch(studies, output_dir, recipe, workers=2)
+        assert summary["processed"] == 0 and summary["skipped"] == 2
+        assert list(summary["failed"]) == ["broken"]
+
+def crash_on_bad(name, *args):
+    """process_study(), except that the "bad" study kills its worker"""
+    if name == "bad":
+        os._exit(1)
+    return process_study(name, *args)
+
+def test_crashing_study_fails_alone():
+    print("🧪 Running a batch with a study that crashes its worker...")
+    with tempfile.TemporaryDirectory() as tmp:
+        studies = os.path.join(tmp, "studies")
+        os.makedirs(studies)
+        for name in ("a", "b", "bad", "c", "d"):
+            sitk.WriteImage(make_ball_ct(size=24, radius=8), os.path.join(studies, f"{name}.nrrd"))
+        
+        recipe = load_recipe()
+        recipe.update(smoothing_iterations=0)
+        summary = run_batch(studies, os.path.join(tmp, "out"), recipe, workers=2, task=crash_on_bad)
+        # Studies that only shared the broken pool are rerun without losing an attempt
+        assert summary["failed"] == {"bad": "worker process crashed"}
+        assert summary["processed"] == 4
+
+if __name__ == "__main__":
+    test_batch_resumes_and_isolates_failures()
+    test_crashing_study_fails_alone()
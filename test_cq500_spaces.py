@@ -3,53 +3,46 @@
 Test CQ500 CT Dataset - Handle spaces in folder names
 """
 
+from dicom_index import DicomIndex
 from med_pipeline import MedicalTo3D
 import os
 
-def find_dicom_folder():
-    """Find a folder with DICOM files, handling spaces in names"""
+def find_dicom_series():
+    """Pick the largest series under the CQ500 tree using the persistent header index"""
     base_path = "sample_data/cq500"
     
-    # Get all directories (ignore ._ files)
     try:
-        all_items = os.listdir(base_path)
-        directories = [item for item in all_items 
-                      if os.path.isdir(os.path.join(base_path, item)) 
-                      and not item.startswith('._')]
+        index = DicomIndex(base_path)
+        parsed = index.scan()
+        series = index.series()
+        print(f"📂 Indexed {len(series)} series ({parsed} new headers read)")
         
-        print(f"📂 Found {len(directories)} patient directories")
-        
-        # Try the first few directories
-        for patient_folder in sorted(directories)[:3]:
-            patient_path = os.path.join(base_path, patient_folder)
-            print(f"🔍 Checking: '{patient_folder}'")
-            
-            # Walk through this patient's folders to find DICOM files
-            for root, dirs, files in os.walk(patient_path):
-                dcm_files = [f for f in files if f.endswith('.dcm')]
-                if dcm_files:
-                    print(f"  ✅ Found {len(dcm_files)} DICOM files in: {root}")
-                    return root, len(dcm_files)
-        
-        print("❌ No DICOM files found in first few directories")
-        return None, 0
+        series_uid = index.largest_series()
+        if series_uid is None:
+            print("❌ No DICOM series found")
+            return index, None, []
         
+        files = [path for path, _ in series[series_uid]]
+        print(f"  ✅ Found {len(files)} DICOM files in: {os.path.dirname(files[0])}")
+        return index, series_uid, files
+    
     except Exception as e:
         print(f"❌ Error exploring directories: {e}")
-        return None, 0
+        return None, None, []
 
 def test_cq500():
     print("🧠 Testing CQ500 CT Dataset (handling spaces)...")
     
     # Find DICOM files
-    dicom_path, file_count = find_dicom_folder()
+    index, series_uid, files = find_dicom_series()
     
-    if not dicom_path:
+    if not series_uid:
         print("❌ No DICOM files found!")
         return
     
+    dicom_path = os.path.dirname(files[0])
     print(f"✅ Using: {dicom_path}")
-    print(f"📄 DICOM files: {file_count}")
+    print(f"📄 DICOM files: {len(files)}")
     
     try:
         # Initialize pipeline
@@ -57,7 +50,8 @@ def test_cq500():
         
         # Load DICOM series
         print("🔄 Loading DICOM series...")
-        pipeline.load_dicom_series(dicom_path)
+        # Reuse the index just built instead of walking the tree again
+        pipeline.load_dicom_series(index.root, series_uid=series_uid, index=index)
         
         # Preprocess CT (standard head CT window)
         print("⚙️ Preprocessing CT...")
@@ -85,9 +79,9 @@ def test_cq500():
         if os.path.exists(output_file):
             size_mb = os.path.getsize(output_file) / (1024 * 1024)
             print(f"   💾 File size: {size_mb:.1f} MB")
-            
+        
         print(f"\n🎮 You can now view {output_file} in any 3D viewer!")
-            
+    
     except Exception as e:
         print(f"❌ Error: {str(e)}")
         import traceback
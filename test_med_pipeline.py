@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+"""
+Test MedicalTo3D on synthetic CT volumes (no dataset needed)
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import SimpleITK as sitk
+
+from bench_pipeline import AIR_HU, PHANTOM_HU, PHANTOMS, bench_phantom, make_phantom, run_isolated
+from bench_preprocessing import make_noisy_ct
+from dicom_index import DicomIndex
+from med_pipeline import MedicalTo3D
+from mesh_smoothing import smooth_vertices, surface_deviation, vertex_adjacency
+from profiling import Profiler
+from stl_to_gltf import compute_normals, polydata_to_arrays
+from vtk.util import numpy_support
+from vtk_bridge import sitk_to_vtk
+
+def make_ball_ct(size=48, radius=16, spacing=(0.8, 0.8, 1.5)):
+    """CT-like volume: air background with a bone-density ball in the middle"""
+    z, y, x = np.mgrid[:size, :size, :size]
+    center = (size - 1) / 2
+    ball = (x - center) ** 2 + (y - center) ** 2 + (z - center) ** 2 < radius ** 2
+    
+    array = np.where(ball, 1200, -1000).astype(np.int16)
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing(spacing)
+    image.SetOrigin((-20.0, 10.0, 5.0))
+    return image
+
+def make_pipeline(**mesh_options):
+    pipeline = MedicalTo3D()
+    pipeline.image = make_ball_ct()
+    pipeline.preprocess_ct()
+    pipeline.segment_threshold(0.4, 1.0)
+    pipeline.generate_mesh(**mesh_options)
+    return pipeline
+
+def test_lod_chain():
+    print("🧪 Building LOD chain...")
+    pipeline = make_pipeline(smoothing_iterations=5)
+    
+    lods = pipeline.generate_lods(max_workers=2)
+    assert [ratio for ratio, _ in lods] == [1.0, 0.25, 0.05, 0.01]
+    assert lods[0][1] is pipeline.mesh
+    
+    triangles = [mesh.GetNumberOfCells() for _, mesh in lods]
+    assert triangles == sorted(triangles, reverse=True)
+    assert abs(triangles[1] / triangles[0] - 0.25) < 0.05
+    
+    # Cached until the mesh changes
+    assert pipeline.generate_lods(max_workers=1) is lods
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest_path = pipeline.export_lods(os.path.join(tmp, "ball.glb"))
+        with open(manifest_path) as f:
+            levels = json.load(f)["levels"]
+        assert [level["ratio"] for level in levels] == [0.01, 0.05, 0.25, 1.0]
+        assert all(os.path.exists(os.path.join(tmp, level["uri"])) for level in levels)
+    
+    pipeline.generate_mesh(smoothing_iterations=0)
+    assert pipeline.lods is None
+
+def triangle_set(mesh):
+    vertices, indices = polydata_to_arrays(mesh)
+    return {frozenset(map(tuple, vertices[t])) for t in indices}
+
+def test_bricked_marching_cubes_matches_monolithic():
+    print("🧪 Comparing bricked and monolithic marching cubes...")
+    pipeline = make_pipeline(smoothing_iterations=0)
+    monolithic = pipeline.mesh
+    
+    for brick_size in (4, 11):
+        bricked = pipeline.generate_mesh(smoothing_iterations=0, brick_size=brick_size, workers=2)
+        assert bricked.GetNumberOfPoints() == monolithic.GetNumberOfPoints()
+        assert bricked.GetNumberOfCells() == monolithic.GetNumberOfCells()
+        assert triangle_set(bricked) == triangle_set(monolithic)
+    
+    smoothed = pipeline.generate_mesh(smoothing_iterations=5, brick_size=8, workers=1)
+    assert smoothed.GetNumberOfPoints() == monolithic.GetNumberOfPoints()
+
+def test_crop_to_roi_keeps_world_coordinates():
+    print("🧪 Cropping segmentation to its bounding box...")
+    meshes = {}
+    for crop in (False, True):
+        pipeline = MedicalTo3D()
+        pipeline.image = make_ball_ct(size=72)
+        pipeline.preprocess_ct()
+        pipeline.segment_threshold(0.4, 1.0, crop=crop)
+        meshes[crop] = polydata_to_arrays(pipeline.generate_mesh(smoothing_iterations=0))
+    
+    index, size = pipeline.roi
+    assert pipeline.segmentation.GetSize() == tuple(size)
+    assert np.prod(size) < 0.2 * 72 ** 3
+    np.testing.assert_allclose(pipeline.segmentation.GetOrigin(),
+                               pipeline.image.TransformIndexToPhysicalPoint(index))
+    
+    full, cropped = meshes[False][0], meshes[True][0]
+    assert len(full) == len(cropped) and len(meshes[False][1]) == len(meshes[True][1])
+    np.testing.assert_allclose(np.sort(full, axis=0), np.sort(cropped, axis=0), atol=1e-4)
+
+def test_sitk_to_vtk_shares_buffer():
+    mask = sitk.Cast(make_ball_ct() > 0, sitk.sitkUInt8)
+    vtk_image = sitk_to_vtk(mask, mask=True)
+    scalars = numpy_support.vtk_to_numpy(vtk_image.GetPointData().GetScalars())
+    
+    assert scalars.dtype == np.uint8
+    assert np.shares_memory(scalars, sitk.GetArrayViewFromImage(mask))
+    
+    # The VTK array keeps the SimpleITK buffer alive on its own
+    del mask
+    assert scalars.sum() > 0
+    
+    labels = sitk_to_vtk(sitk.Cast(make_ball_ct() > 0, sitk.sitkUInt32), mask=True)
+    assert labels.GetPointData().GetScalars().GetDataType() == vtk_image.GetPointData().GetScalars().GetDataType()
+
+def test_direction_applied_to_mesh():
+    print("🧪 Meshing an image with a rotated and a mirrored direction...")
+    reference = make_pipeline(smoothing_iterations=0)
+    ref_vertices, _ = polydata_to_arrays(reference.mesh)
+    origin = np.array(reference.segmentation.GetOrigin())
+    
+    rotation = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]], dtype=float)
+    mirror = np.diag([1.0, 1.0, -1.0])
+    for direction in (rotation, mirror):
+        pipeline = MedicalTo3D()
+        pipeline.image = make_ball_ct()
+        pipeline.image.SetDirection(direction.ravel().tolist())
+        pipeline.preprocess_ct()
+        pipeline.segment_threshold(0.4, 1.0)
+        
+        # Every point is the reference point rotated about the cropped image origin
+        expected = (ref_vertices - origin) @ direction.T + np.array(pipeline.segmentation.GetOrigin())
+        for brick_size in (None, 9):
+            vertices, indices = polydata_to_arrays(pipeline.generate_mesh(0, brick_size=brick_size, workers=1))
+            np.testing.assert_allclose(np.sort(vertices, axis=0), np.sort(expected, axis=0), atol=1e-3)
+            
+            # Faces still point away from the ball centre
+            normals = compute_normals(vertices, indices)
+            assert np.all(np.sum((vertices - vertices.mean(axis=0)) * normals, axis=1) > 0)
+
+def test_native_hu_matches_float_window():
+    print("🧪 Comparing native-HU and float32 segmentation...")
+    masks = {}
+    for native_hu, thresholds, hu in ((False, (0.22, 0.6), False), (True, (0.22, 0.6), False),
+                                      (True, (100, 2000), True), (False, (100, 2000), True)):
+        pipeline = MedicalTo3D()
+        pipeline.image = make_noisy_ct((40, 64, 64))
+        pipeline.preprocess_ct(window_min=-1000, window_max=4000, native_hu=native_hu)
+        assert pipeline.image.GetPixelID() == (sitk.sitkInt16 if native_hu else sitk.sitkFloat32)
+        
+        pipeline.segment_threshold(*thresholds, hu=hu)
+        masks[native_hu, hu] = sitk.GetArrayFromImage(pipeline.segmentation)
+    
+    np.testing.assert_array_equal(masks[False, False], masks[True, False])
+    np.testing.assert_array_equal(masks[True, True], masks[False, True])
+    assert masks[False, False].sum() > 0
+    
+    display = pipeline.display_image()
+    assert display.GetPixelID() == sitk.sitkFloat32
+    assert 0.0 <= sitk.GetArrayViewFromImage(display).min() <= sitk.GetArrayViewFromImage(display).max() <= 1.0
+
+def test_multi_label_meshes():
+    print("🧪 Segmenting three tissues in one pass...")
+    pipeline = MedicalTo3D()
+    pipeline.image = make_noisy_ct((48, 64, 64))
+    pipeline.preprocess_ct(native_hu=True)
+    
+    tissues = [("soft", -100, 200, [0.8, 0.6, 0.6]), ("bone", 500, 32767, [0.9, 0.9, 0.8]),
+               ("missing", 3000, 3100)]
+    labels = sitk.GetArrayViewFromImage(pipeline.segment_labels(tissues, hu=True))
+    hu = sitk.GetArrayViewFromImage(pipeline.image)
+    np.testing.assert_array_equal(labels == 1, (hu >= -100) & (hu <= 200))
+    np.testing.assert_array_equal(labels == 2, hu >= 500)
+    
+    meshes = pipeline.generate_label_meshes(smoothing_iterations=0)
+    assert sorted(meshes) == ["bone", "soft"]
+    assert meshes["bone"][1] == [0.9, 0.9, 0.8]
+    
+    # Each label's surface matches a single-label extraction of the same mask
+    pipeline.segmentation = sitk.Cast(pipeline.labels == 2, sitk.sitkUInt8)
+    single = pipeline.generate_mesh(smoothing_iterations=0)
+    assert meshes["bone"][0].GetNumberOfCells() == single.GetNumberOfCells()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = pipeline.export_label_meshes(os.path.join(tmp, "{name}.glb"))
+        assert sorted(os.path.basename(p) for p in paths.values()) == ["bone.glb", "soft.glb"]
+
+def test_surface_methods_agree():
+    pipeline = make_pipeline(smoothing_iterations=0, method="marching_cubes")
+    reference = triangle_set(pipeline.mesh)
+    
+    for method in ("flying_edges", "discrete_flying_edges"):
+        mesh = pipeline.generate_mesh(smoothing_iterations=0, method=method, threads=2)
+        assert triangle_set(mesh) == reference, method
+        bricked = pipeline.generate_mesh(smoothing_iterations=0, method=method, brick_size=10, workers=1)
+        assert triangle_set(bricked) == reference, method
+    
+    try:
+        pipeline.generate_mesh(method="surface_nets")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown method accepted")
+
+def run_cached(cache_dir, source, smoothing_iterations):
+    pipeline = MedicalTo3D(cache_dir=cache_dir)
+    pipeline.load_nrrd(source)
+    pipeline.preprocess_ct()
+    pipeline.segment_threshold(0.4, 1.0)
+    pipeline.generate_mesh(smoothing_iterations=smoothing_iterations)
+    return pipeline
+
+def cached_stages(pipeline):
+    return {record["name"] for record in pipeline.profiler.records if record.get("cached")}
+
+def test_stage_cache():
+    print("🧪 Reusing cached stages...")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "ball.nrrd")
+        sitk.WriteImage(make_ball_ct(), source)
+        cache_dir = os.path.join(tmp, "cache")
+        
+        first = run_cached(cache_dir, source, 5)
+        second = run_cached(cache_dir, source, 5)
+        
+        assert cached_stages(first) == set()
+        assert cached_stages(second) == {"load_nrrd", "preprocess_ct", "segment_threshold", "generate_mesh"}
+        assert triangle_set(second.mesh) == triangle_set(first.mesh)
+        assert list(second.roi) == list(first.roi)
+        
+        # Cache hits return the image just like a cold run
+        for stage in (second.load_nrrd(source), second.preprocess_ct(), second.segment_threshold(0.4, 1.0)):
+            assert isinstance(stage, sitk.Image)
+        assert np.array_equal(sitk.GetArrayFromImage(second.segmentation),
+                              sitk.GetArrayFromImage(first.segmentation))
+        
+        # Changing only the smoothing reuses the cached segmentation
+        third = run_cached(cache_dir, source, 0)
+        assert cached_stages(third) == {"load_nrrd", "preprocess_ct", "segment_threshold"}
+        assert np.array_equal(sitk.GetArrayFromImage(third.segmentation),
+                              sitk.GetArrayFromImage(first.segmentation))
+        
+        # Oldest artefacts go first once the cache is over budget
+        cache = third.cache
+        sizes = sorted(os.path.getsize(path) for path in cache._entries())
+        cache.max_bytes = cache.size() - sizes[0]
+        cache.evict()
+        assert cache.size() <= cache.max_bytes
+
+def write_dicom_series(folder, image, series_uid):
+    """Write a volume as one DICOM file per slice, shuffled on disk"""
+    os.makedirs(folder, exist_ok=True)
+    direction = image.GetDirection()
+    writer = sitk.ImageFileWriter()
+    writer.KeepOriginalImageUIDOn()
+    for index in np.random.default_rng(0).permutation(image.GetDepth()):
+        slice_image = image[:, :, int(index)]
+        position = image.TransformIndexToPhysicalPoint((0, 0, int(index)))
+        slice_image.SetMetaData("0008|0060", "CT")
+        slice_image.SetMetaData("0020|000e", series_uid)
+        slice_image.SetMetaData("0020|0013", str(index))
+        slice_image.SetMetaData("0020|0032", "\\".join(f"{v:.6f}" for v in position))
+        slice_image.SetMetaData("0020|0037", "\\".join(f"{v:.6f}" for v in direction[0::3] + direction[1::3]))
+        writer.SetFileName(os.path.join(folder, f"slice{index:03d}.dcm"))
+        writer.Execute(slice_image)
+
+def test_dicom_index_loads_series():
+    print("🧪 Loading an indexed DICOM series...")
+    image = sitk.Cast(make_ball_ct(size=24, radius=8), sitk.sitkInt16)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_dicom_series(os.path.join(tmp, "study", "ct"), image, "1.2.3.4")
+        write_dicom_series(os.path.join(tmp, "study", "scout"), image[:, :, :3], "1.2.3.5")
+        with open(os.path.join(tmp, "study", "notes.txt"), 'w') as f:
+            f.write("not a DICOM file")
+        
+        pipeline = MedicalTo3D()
+        loaded = pipeline.load_dicom_series(tmp)
+        
+        reference = sitk.ImageSeriesReader()
+        reference.SetFileNames(reference.GetGDCMSeriesFileNames(os.path.join(tmp, "study", "ct")))
+        expected = reference.Execute()
+        assert np.array_equal(sitk.GetArrayViewFromImage(loaded), sitk.GetArrayViewFromImage(expected))
+        assert np.allclose(loaded.GetOrigin(), expected.GetOrigin(), atol=1e-4)
+        assert np.allclose(loaded.GetSpacing(), expected.GetSpacing(), atol=1e-4)
+        assert np.allclose(loaded.GetDirection(), expected.GetDirection(), atol=1e-4)
+        
+        # Headers are read once; the index is persisted next to the data
+        index = DicomIndex(tmp)
+        assert index.scan() == 0
+        assert sorted(len(slices) for slices in index.series().values()) == [3, 24]
+        
+        # Reloading only rechecks the chosen series' directory; rescan walks everything
+        extra = os.path.join("study", "scout", "extra.txt")
+        with open(os.path.join(tmp, extra), 'w') as f:
+            f.write("not a DICOM file")
+        pipeline.load_dicom_series(tmp, index=index)
+        assert index.series_directories("1.2.3.4") == [os.path.join("study", "ct")]
+        assert extra not in DicomIndex(tmp).files
+        pipeline.load_dicom_series(tmp, rescan=True)
+        assert extra in DicomIndex(tmp).files
+
+def test_stage_profile():
+    print("🧪 Profiling pipeline stages...")
+    pipeline = make_pipeline(smoothing_iterations=5)
+    records = {record["name"]: record for record in pipeline.profiler.records}
+    
+    assert list(pipeline.profiler.totals()) == ["preprocess_ct", "segment_threshold", "generate_mesh"]
+    for name in ("windowing", "connected components", "median filter", "surface extraction", "smoothing"):
+        assert records[name]["depth"] == 1, name
+    assert records["segment_threshold"]["voxels"] == np.prod(pipeline.segmentation.GetSize())
+    assert records["generate_mesh"]["triangles"] == pipeline.mesh.GetNumberOfCells()
+    assert all(record["wall"] >= 0 and record["cpu"] >= 0 for record in records.values())
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(pipeline.profiler.save_chrome_trace(os.path.join(tmp, "trace.json"))) as f:
+            events = json.load(f)["traceEvents"]
+        assert len(events) == len(pipeline.profiler.records)
+        assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    
+    # Each stage reports its own peak RSS, not the process high-water mark so far
+    profiler = Profiler()
+    with profiler.stage("large"):
+        np.ones(1 << 25).sum()
+    with profiler.stage("small"):
+        np.ones(1 << 10).sum()
+    large, small = profiler.records
+    if large["peak_rss_mb"] is not None:
+        assert small["peak_rss_mb"] < large["peak_rss_mb"] - 200
+        assert small["process_peak_rss_mb"] >= large["peak_rss_mb"]
+
+def test_out_of_core_matches_in_memory():
+    print("🧪 Streaming a volume in slabs...")
+    image = make_noisy_ct(shape=(40, 48, 48), seed=3)
+    image.SetSpacing((0.7, 0.7, 1.2))
+    image.SetOrigin((5.0, -3.0, 12.0))
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Whole head, then a noise band fragmented into ~1500 components
+        for lower, upper in ((0.18, 1.0), (0.21, 0.3)):
+            reference = MedicalTo3D()
+            reference.image = image
+            reference.preprocess_ct()
+            reference.segment_threshold(lower, upper)
+            reference.generate_mesh(smoothing_iterations=0)
+            
+            for name, compress in (("raw.nrrd", False), ("gzip.nrrd", True)):
+                path = os.path.join(tmp, name)
+                sitk.WriteImage(image, path, useCompression=compress)
+                
+                pipeline = MedicalTo3D()
+                volume = pipeline.load_streaming(path, slab_size=7, spill_dir=tmp)
+                assert isinstance(volume.array, np.memmap)
+                pipeline.preprocess_ct()
+                mask = pipeline.segment_threshold(lower, upper)
+                assert pipeline.roi == reference.roi
+                assert np.array_equal(mask.array, sitk.GetArrayViewFromImage(reference.segmentation))
+                assert np.allclose(mask.GetOrigin(), reference.segmentation.GetOrigin())
+                
+                mesh = pipeline.generate_mesh(smoothing_iterations=0, workers=1)
+                assert triangle_set(mesh) == triangle_set(reference.mesh), name
+
+def test_keep_components():
+    print("🧪 Selecting components by rank and volume...")
+    z, y, x = np.mgrid[:32, :32, :64]
+    array = np.full(z.shape, -1000, dtype=np.int16)
+    for center, radius in (((16, 16, 12), 8), ((16, 16, 34), 6), ((16, 16, 52), 3)):
+        array[(x - center[2]) ** 2 + (y - center[1]) ** 2 + (z - center[0]) ** 2 < radius ** 2] = 1200
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing((0.5, 0.5, 2.0))
+    
+    def kept_balls(mask):
+        return [bool(mask[16, 16, column]) for column in (12, 34, 52)]
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "balls.nrrd")
+        sitk.WriteImage(image, path)
+        
+        # Smallest ball: ~113 voxels of 0.5 mm³
+        for options, expected in (({}, [True, False, False]),
+                                  ({"keep": 2}, [True, True, False]),
+                                  ({"keep": None, "min_volume": 100.0}, [True, True, False]),
+                                  ({"keep": None}, [True, True, True])):
+            pipeline = MedicalTo3D()
+            pipeline.image = image
+            pipeline.preprocess_ct()
+            mask = sitk.GetArrayViewFromImage(pipeline.segment_threshold(0.4, 1.0, crop=False, **options))
+            assert kept_balls(mask) == expected, options
+            
+            streamed = MedicalTo3D()
+            streamed.load_streaming(path, slab_size=5, spill_dir=tmp)
+            streamed.preprocess_ct()
+            assert np.array_equal(streamed.segment_threshold(0.4, 1.0, crop=False, **options).array, mask)
+            assert streamed.roi == pipeline.roi
+        
+        # keep=0 is rejected on both paths rather than meaning "none" or "all"
+        streamed = MedicalTo3D()
+        streamed.load_streaming(path, slab_size=5, spill_dir=tmp)
+        streamed.preprocess_ct()
+        for candidate in (pipeline, streamed):
+            try:
+                candidate.segment_threshold(0.4, 1.0, crop=False, keep=0)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("keep=0 accepted")
+
+def test_volume_bricks():
+    print("🧪 Exporting a bricked volume pyramid...")
+    pipeline = MedicalTo3D()
+    pipeline.image = make_ball_ct(size=80, radius=12)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(pipeline.export_volume_bricks(tmp, brick_size=32, max_size=64)) as f:
+            manifest = json.load(f)
+        assert manifest["units"] == "HU" and manifest["value_range"] == [-1000.0, 1200.0]
+        assert [level["size"] for level in manifest["levels"]] == [[20, 20, 20], [40, 40, 40]]
+        
+        finest = manifest["levels"][-1]
+        volume = np.zeros(finest["size"][::-1], dtype=np.uint16)
+        for brick in finest["bricks"]:
+            if "uri" in brick:
+                x, y, z = brick["offset"]
+                width, height, depth = brick["size"]
+                data = np.fromfile(os.path.join(tmp, brick["uri"]), dtype="<u2")
+                volume[z:z + depth, y:y + height, x:x + width] = data.reshape(depth, height, width)
+        # Only the brick holding the ball has anything above air
+        assert sum("uri" in brick for brick in finest["bricks"]) == 1 and len(finest["bricks"]) == 8
+        
+        shrunk = sitk.BinShrink(pipeline.image, [2, 2, 2])
+        expected = (sitk.GetArrayFromImage(shrunk) + 1000.0) * (65535 / 2200.0)
+        assert np.abs(volume - expected).max() <= 1
+        
+        # Voxel (0, 0, 0) of each level sits at that level's origin
+        matrix = np.array(finest["index_to_physical"]).reshape(4, 4)
+        assert np.allclose(matrix @ [0, 0, 0, 1], list(shrunk.GetOrigin()) + [1])
+        assert np.allclose(matrix @ [1, 1, 1, 1], list(np.add(shrunk.GetOrigin(), shrunk.GetSpacing())) + [1])
+
+def test_taubin_smoothing():
+    print("🧪 Smoothing on CSR adjacency...")
+    # Two triangles sharing an edge, plus an unused vertex
+    offsets, neighbors = vertex_adjacency(np.array([[0, 1, 2], [2, 1, 3]]), 5)
+    assert offsets.tolist() == [0, 2, 5, 8, 10, 10]
+    assert neighbors.tolist() == [1, 2, 0, 2, 3, 0, 1, 3, 1, 2]
+    
+    pipeline = make_pipeline(smoothing_iterations=20)
+    reference, _ = polydata_to_arrays(pipeline.mesh)
+    # The Taubin worker count leaves VTK's SMP thread count alone
+    from vtkmodules.vtkCommonCore import vtkSMPTools
+    smp_threads = vtkSMPTools.GetEstimatedNumberOfThreads()
+    pipeline.generate_mesh(smoothing_iterations=20, smoother="taubin", smoothing_workers=1)
+    assert vtkSMPTools.GetEstimatedNumberOfThreads() == smp_threads
+    vertices, _ = polydata_to_arrays(pipeline.mesh)
+    smoothing = [record for record in pipeline.profiler.records if record["name"] == "smoothing"][-1]
+    
+    # Stops early and lands close to the VTK windowed sinc surface
+    assert 0 < smoothing["iterations"] < 20
+    assert surface_deviation(vertices, reference)["mean"] < 0.25
+    
+    # Split across threads or not, every pass computes the same vertices
+    vertices, indices = polydata_to_arrays(pipeline.generate_mesh(0))
+    offsets, neighbors = vertex_adjacency(indices, len(vertices))
+    serial, _ = smooth_vertices(vertices, offsets, neighbors, 5, workers=1)
+    threaded, _ = smooth_vertices(vertices, offsets, neighbors, 5, workers=3)
+    assert np.array_equal(serial, threaded)
+
+def test_resample_to_isotropic_grid():
+    print("🧪 Resampling to an isotropic grid...")
+    reference = make_pipeline()
+    
+    pipeline = MedicalTo3D()
+    pipeline.image = make_ball_ct()
+    pipeline.preprocess_ct()
+    pipeline.segment_threshold(0.4, 1.0, crop=False)
+    pipeline.resample(spacing=2.0, max_voxels=12000)
+    
+    # The budget wins over the requested spacing, over the same physical box
+    size, spacing = pipeline.image.GetSize(), pipeline.image.GetSpacing()
+    assert np.prod(size) <= 12000 and spacing[0] == spacing[1] == spacing[2] > 2.0
+    np.testing.assert_allclose(np.multiply(size, spacing), [38.4, 38.4, 72.0], atol=spacing[0])
+    # Masks are resampled by nearest neighbour, so they stay binary
+    assert set(np.unique(sitk.GetArrayViewFromImage(pipeline.segmentation))) == {0, 1}
+    
+    # Linear interpolation blurs the edge, so threshold halfway between air (0) and bone (0.44)
+    pipeline.segment_threshold(0.2, 1.0)
+    mesh = pipeline.generate_mesh()
+    assert mesh.GetNumberOfCells() < reference.mesh.GetNumberOfCells() / 2
+    np.testing.assert_allclose(mesh.GetBounds(), reference.mesh.GetBounds(), atol=spacing[0])
+    
+    # A scan within budget keeps its native grid
+    assert pipeline.resample(max_voxels=10 ** 9) is pipeline.image
+
+def test_benchmark_phantoms():
+    print("🧪 Benchmarking stages on synthetic phantoms...")
+    for kind in PHANTOMS:
+        image = make_phantom(kind, size=40)
+        values = sitk.GetArrayViewFromImage(image)
+        assert image.GetSize() == (40, 40, 40) and values.min() == AIR_HU and values.max() == PHANTOM_HU[kind]
+        
+        result = bench_phantom(kind, 40, smoothing_iterations=5)
+        assert result["triangles"] > 0 and result["segmented_voxels"] > 0
+        stages = result["stages"]
+        assert set(stages) == {"preprocess_ct", "segment_threshold", "_keep_largest_components", "generate_mesh",
+                               "export_stl", "export_gltf", "stl_to_gltf"}
+        assert stages["segment_threshold"]["voxels_per_s"] > 0 and stages["stl_to_gltf"]["triangles_per_s"] > 0
+        assert all(stage["process_peak_rss_mb"] > 0 for stage in stages.values())
+        json.dumps(result)
+    
+    # A worker that dies without posting a result is reported, not waited on forever
+    crashed = run_isolated(multiprocessing.get_context("spawn"), "spheres", 40, 5, target=crash_phantom)
+    assert crashed["error"] == "worker process died (exit code 3)"
+
+def crash_phantom(kind, size, smoothing_iterations, results):
+    """Stands in for a benchmark worker killed mid-run"""
+    os._exit(3)
+
+def cold_import_seconds(module):
+    """Best of two fresh-interpreter imports of module, and the VTK modules it loaded"""
+    script = (f"import sys, time; start = time.perf_counter(); import {module}; "
+              "print(time.perf_counter() - start, *sorted(name for name in sys.modules if name.startswith('vtkmodules.')))")
+    runs = [subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split() for _ in range(2)]
+    return min(float(run[0]) for run in runs), runs[0][1:]
+
+def test_cold_start():
+    print("🧪 Cold-start import time...")
+    seconds, vtk_modules = cold_import_seconds("med_pipeline")
+    vtk_seconds, _ = cold_import_seconds("vtk")
+    print(f"   import med_pipeline: {seconds * 1000:.0f} ms (import vtk alone: {vtk_seconds * 1000:.0f} ms)")
+    
+    # VTK loads with the first stage that needs it, not with the pipeline
+    assert vtk_modules == []
+    assert seconds < vtk_seconds
+def test_stage_cache_tells_studies_apart():
+    print("🧪 Keying cached loads on where the input lives...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, "cache")
+        
+        # Same file names, sizes and mtimes (as after cp -p), different pixels
+        first = os.path.join(tmp, "a")
+        write_dicom_series(first, sitk.Cast(make_ball_ct(size=24, radius=8), sitk.sitkInt16), "1.2.3")
+        second = os.path.join(tmp, "b")
+        shutil.copytree(first, second)
+        for name in os.listdir(second):
+            path = os.path.join(second, name)
+            stat = os.stat(path)
+            # Pixel data is the last element of each slice
+            with open(path, 'r+b') as f:
+                f.seek(-24 * 24 * 2, os.SEEK_END)
+                f.write(bytes(24 * 24 * 2))
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        
+        arrays = []
+        for folder in (first, second):
+            pipeline = MedicalTo3D(cache_dir=cache_dir)
+            arrays.append(sitk.GetArrayFromImage(pipeline.load_dicom_series(folder)))
+            assert cached_stages(pipeline) == set()
+        assert not np.array_equal(*arrays)
+        
+        # Rewriting a detached header's data file is a new input too
+        header = os.path.join(tmp, "ball.nhdr")
+        sitk.WriteImage(make_ball_ct(size=24, radius=8), header)
+        original = MedicalTo3D(cache_dir=cache_dir)
+        original.load_nrrd(header)
+        with open(os.path.join(tmp, "ball.raw"), 'r+b') as f:
+            f.write(bytes(64))
+        rewritten = MedicalTo3D(cache_dir=cache_dir)
+        rewritten.load_nrrd(header)
+        assert cached_stages(rewritten) == set()
+        assert not np.array_equal(sitk.GetArrayFromImage(original.image), sitk.GetArrayFromImage(rewritten.image))
+
+if __name__ == "__main__":
+    test_lod_chain()
+    test_bricked_marching_cubes_matches_monolithic()
+    test_crop_to_roi_keeps_world_coordinates()
+    test_sitk_to_vtk_shares_buffer()
+    test_direction_applied_to_mesh()
+    test_native_hu_matches_float_window()
+    test_multi_label_meshes()
+    test_surface_methods_agree()
+    test_stage_cache()
+    test_stage_cache_tells_studies_apart()
+    test_dicom_index_loads_series()
+    test_stage_profile()
+    test_out_of_core_matches_in_memory()
+    test_keep_components()
+    test_volume_bricks()
+    test_taubin_smoothing()
+    test_resample_to_isotropic_grid()
+    test_benchmark_phantoms()
+    test_cold_start()
@@ -46,7 +46,7 @@ def test_pipeline():
         pipeline.generate_mesh(smoothing_iterations=10)
         
         # Export
-        output_file = f"outputs/test_model_{os.path.basename(test_file)}.stl"
+        output_file = f"outputs/test_model_{os.path.basename(test_file)}.glb"
         pipeline.export_gltf(output_file)
         
         print(f"✅ Test completed! Output: {output_file}")
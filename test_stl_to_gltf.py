@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Test STL → GLTF conversion on synthetic meshes
+"""
+
+import os
+import tempfile
+import numpy as np
+import vtk
+
+from bench_stl_to_gltf import benchmark, make_sphere_stl
+from stl_to_gltf import (compute_normals, optimize_mesh, polydata_to_arrays, polydata_to_gltf,
+                         quantize_geometry, read_glb, split_primitives, stl_to_gltf, write_glb)
+
+def test_matches_legacy_output():
+    print("🧪 Comparing vectorized conversion with legacy output...")
+    results = benchmark(resolutions=(24,))
+    print(f"✅ Identical output, {results[0]['speedup']}x faster")
+
+def test_area_weighted_normals():
+    # Two faces sharing an edge: a large one in the XY plane, a small one in XZ
+    vertices = np.array([[0, 0, 0], [10, 0, 0], [0, 10, 0], [0, 0, 1]], dtype=np.float32)
+    indices = np.array([[0, 1, 2], [0, 3, 1]], dtype=np.uint32)
+    
+    uniform = compute_normals(vertices, indices)
+    weighted = compute_normals(vertices, indices, area_weighted=True)
+    
+    np.testing.assert_allclose(uniform[0], [0, np.sqrt(0.5), np.sqrt(0.5)], atol=1e-6)
+    assert weighted[0, 2] > 0.99
+    np.testing.assert_allclose(np.linalg.norm(weighted, axis=1), 1.0, atol=1e-6)
+
+def test_glb_layout():
+    print("🧪 Checking GLB chunk layout...")
+    with tempfile.TemporaryDirectory() as tmp:
+        stl_path = os.path.join(tmp, "sphere.stl")
+        make_sphere_stl(stl_path, 16)
+        stl_to_gltf(stl_path, os.path.join(tmp, "sphere.gltf"))
+        stl_to_gltf(stl_path, os.path.join(tmp, "sphere.glb"))
+        
+        glb_size = os.path.getsize(os.path.join(tmp, "sphere.glb"))
+        assert glb_size % 4 == 0
+        assert glb_size < os.path.getsize(os.path.join(tmp, "sphere.gltf"))
+        
+        gltf, binary = read_glb(os.path.join(tmp, "sphere.glb"))
+    
+    positions, normals, indices = gltf["accessors"]
+    interleaved, index_view = gltf["bufferViews"]
+    assert interleaved["byteStride"] == 24 and normals["byteOffset"] == 12
+    assert index_view["byteOffset"] % 4 == 0
+    assert len(binary) >= gltf["buffers"][0]["byteLength"]
+    
+    vertex_data = np.frombuffer(binary, np.float32, positions["count"] * 6).reshape(-1, 6)
+    index_data = np.frombuffer(binary, np.uint32, indices["count"], index_view["byteOffset"])
+    np.testing.assert_allclose(vertex_data[:, :3].min(axis=0), positions["min"])
+    np.testing.assert_allclose(np.linalg.norm(vertex_data[:, 3:], axis=1), 1.0, atol=1e-5)
+    assert index_data.max() < positions["count"]
+
+def test_glb_streams_in_blocks():
+    vertices = np.random.default_rng(0).random((1001, 3), dtype=np.float32)
+    normals = np.tile(np.float32([0, 0, 1]), (1001, 1))
+    indices = np.arange(999, dtype=np.uint32)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        write_glb(os.path.join(tmp, "a.glb"), vertices, normals, indices)
+        write_glb(os.path.join(tmp, "b.glb"), vertices, normals, indices, block_size=100)
+        assert read_glb(os.path.join(tmp, "a.glb")) == read_glb(os.path.join(tmp, "b.glb"))
+
+def test_polydata_export_keeps_topology():
+    print("🧪 Exporting in-memory vtkPolyData...")
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(20)
+    sphere.SetPhiResolution(20)
+    sphere.Update()
+    mesh = sphere.GetOutput()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        glb_path = os.path.join(tmp, "sphere.glb")
+        gltf_path = os.path.join(tmp, "sphere.gltf")
+        assert polydata_to_gltf(mesh, glb_path) == mesh.GetNumberOfPoints()
+        polydata_to_gltf(mesh, gltf_path, embed_data=False)
+        
+        gltf, binary = read_glb(glb_path)
+        assert os.path.exists(os.path.join(tmp, "sphere.bin"))
+        with open(os.path.join(tmp, "sphere.bin"), "rb") as f:
+            assert f.read() == binary[:gltf["buffers"][0]["byteLength"]]
+    
+    positions, normals, indices = gltf["accessors"]
+    assert positions["count"] == mesh.GetNumberOfPoints()
+    assert indices["count"] == 3 * mesh.GetNumberOfCells()
+    
+    # The sphere source carries its own analytic normals; they are passed through
+    vertex_data = np.frombuffer(binary, np.float32, positions["count"] * 6).reshape(-1, 6)
+    np.testing.assert_allclose(vertex_data[:, 3:], vertex_data[:, :3] / 0.5, atol=1e-5)
+
+def test_quantized_glb():
+    print("🧪 Checking quantized GLB...")
+    with tempfile.TemporaryDirectory() as tmp:
+        stl_path = os.path.join(tmp, "sphere.stl")
+        make_sphere_stl(stl_path, 64)
+        stl_to_gltf(stl_path, os.path.join(tmp, "full.glb"))
+        stl_to_gltf(stl_path, os.path.join(tmp, "small.glb"), quantize=True)
+        
+        full_size = os.path.getsize(os.path.join(tmp, "full.glb"))
+        small_size = os.path.getsize(os.path.join(tmp, "small.glb"))
+        assert small_size < 0.6 * full_size
+        
+        full, full_binary = read_glb(os.path.join(tmp, "full.glb"))
+        gltf, binary = read_glb(os.path.join(tmp, "small.glb"))
+    
+    assert gltf["extensionsRequired"] == ["KHR_mesh_quantization"]
+    positions, normals, indices = gltf["accessors"]
+    assert positions["componentType"] == 5122 and positions["normalized"]
+    assert normals["componentType"] == 5120 and normals["byteOffset"] == 8
+    assert indices["componentType"] == 5123
+    assert indices["count"] == full["accessors"][2]["count"]
+    
+    # Dequantize through the node transform and compare against the float bounds
+    node = gltf["nodes"][0]
+    stored = np.frombuffer(binary, np.int16, positions["count"] * 6).reshape(-1, 6)[:, :3]
+    decoded = stored / 32767.0 * node["scale"] + node["translation"]
+    np.testing.assert_allclose(decoded.min(axis=0), full["accessors"][0]["min"], atol=1e-2)
+    np.testing.assert_allclose(decoded.max(axis=0), full["accessors"][0]["max"], atol=1e-2)
+
+def test_quantization_error_bounds():
+    vertices = np.random.default_rng(1).uniform(-80, 120, (500, 3)).astype(np.float32)
+    normals = compute_normals(vertices, np.arange(498, dtype=np.uint32).reshape(-1, 3))
+    _, _, _, scale, report = quantize_geometry(vertices, normals)
+    
+    assert report["max_position_error"] <= scale / 32767 * np.sqrt(3)
+    assert report["max_normal_error_degrees"] < 1.0
+    assert report["quantized_vertex_bytes"] == report["raw_vertex_bytes"] // 2
+
+def test_optimize_mesh_preserves_triangles():
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(30)
+    sphere.SetPhiResolution(30)
+    sphere.Update()
+    
+    vertices, indices = polydata_to_arrays(sphere.GetOutput())
+    normals = vertices / 0.5
+    new_vertices, new_normals, new_indices = optimize_mesh(vertices, normals, indices)
+    
+    # Same set of triangles (as coordinate triples), vertices in first-use order
+    before = {tuple(map(tuple, vertices[t])) for t in indices.reshape(-1, 3)}
+    after = {tuple(map(tuple, new_vertices[t])) for t in new_indices.reshape(-1, 3)}
+    assert before == after
+    _, first_use = np.unique(new_indices, return_index=True)
+    assert np.all(np.diff(first_use) > 0)
+    np.testing.assert_allclose(new_normals, new_vertices / 0.5, atol=1e-5)
+
+def test_split_primitives_fit_uint16():
+    sphere = vtk.vtkSphereSource()
+    sphere.SetThetaResolution(40)
+    sphere.SetPhiResolution(40)
+    sphere.Update()
+    vertices, indices = polydata_to_arrays(sphere.GetOutput())
+    
+    order, primitives = split_primitives(indices, max_vertices=200)
+    assert len(primitives) > 1
+    
+    rebuilt = []
+    for first_vertex, vertex_count, local in primitives:
+        assert vertex_count < 200 and local.dtype == np.uint16
+        assert local.max() == vertex_count - 1
+        rebuilt.append(order[first_vertex + local.astype(np.int64)])
+    np.testing.assert_array_equal(np.concatenate(rebuilt), indices.ravel())
+
+def test_empty_mesh_is_rejected():
+    print("🧪 Refusing to export an empty mesh...")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, quantize in (("empty.glb", False), ("empty.glb", True), ("empty.gltf", False), ("empty.gltf", True)):
+            try:
+                polydata_to_gltf(vtk.vtkPolyData(), os.path.join(tmp, name), quantize=quantize)
+            except ValueError as e:
+                assert "no vertices" in str(e), e
+            else:
+                raise AssertionError(f"empty mesh written to {name}")
+            assert not os.path.exists(os.path.join(tmp, name))
+
+if __name__ == "__main__":
+    test_matches_legacy_output()
+    test_area_weighted_normals()
+    test_glb_layout()
+    test_glb_streams_in_blocks()
+    test_polydata_export_keeps_topology()
+    test_quantized_glb()
+    test_quantization_error_bounds()
+    test_optimize_mesh_preserves_triangles()
+    test_split_primitives_fit_uint16()
+    test_empty_mesh_is_rejected()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Bricked volume pyramids for GPU ray marching
+Downsamples an intensity volume into a pyramid of levels, quantizes each to
+uint8/uint16 and writes it as raw bricks plus a JSON manifest, so the viewer
+can ray-march the scan and change its transfer function without re-meshing
+"""
+
+import json
+import os
+import numpy as np
+import SimpleITK as sitk
+
+from profiling import log
+
+DEFAULT_BRICK_SIZE = 64
+# Largest level 0 edge in voxels; coarser levels halve until MIN_LEVEL_SIZE
+DEFAULT_MAX_SIZE = 512
+MIN_LEVEL_SIZE = 32
+BRICK_DTYPES = {"uint8": np.dtype("<u1"), "uint16": np.dtype("<u2")}
+
+def build_pyramid(image, max_size=DEFAULT_MAX_SIZE, min_size=MIN_LEVEL_SIZE):
+    """Levels of image, finest first, each bin-averaged from the previous
+
+    Level 0 is shrunk by whole factors until no edge exceeds max_size; each
+    further level halves every edge still longer than min_size.
+    """
+    factors = [max(1, -(-size // max_size)) for size in image.GetSize()]
+    level = sitk.BinShrink(image, factors) if max(factors) > 1 else image
+    levels = [level]
+    while max(level.GetSize()) > min_size:
+        factors = [2 if size > min_size else 1 for size in level.GetSize()]
+        level = sitk.BinShrink(level, factors)
+        levels.append(level)
+    return levels
+
+def quantize(array, value_range, dtype):
+    """Map value_range linearly onto dtype's full range, clamping outside it"""
+    lower, upper = value_range
+    top = np.iinfo(dtype).max
+    scaled = (np.asarray(array, dtype=np.float32) - lower) * (top / max(upper - lower, 1e-12))
+    return np.clip(np.rint(scaled), 0, top).astype(dtype)
+
+def index_to_physical(image):
+    """Row-major 4x4 matrix taking (i, j, k, 1) voxel indices to physical (x, y, z, 1)"""
+    matrix = np.eye(4)
+    matrix[:3, :3] = np.array(image.GetDirection()).reshape(3, 3) * np.array(image.GetSpacing())
+    matrix[:3, 3] = image.GetOrigin()
+    return matrix
+
+def write_bricks(image, directory, value_range, dtype, brick_size=DEFAULT_BRICK_SIZE):
+    """Write image as brick_size^3 raw bricks (x fastest); returns their manifest entries
+
+    Bricks that quantize to all zeros are listed without a uri and not written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    array = sitk.GetArrayViewFromImage(image)
+    depth, height, width = array.shape
+    bricks = []
+    for z in range(0, depth, brick_size):
+        for y in range(0, height, brick_size):
+            for x in range(0, width, brick_size):
+                brick = quantize(array[z:z + brick_size, y:y + brick_size, x:x + brick_size], value_range, dtype)
+                entry = {"offset": [x, y, z], "size": list(brick.shape[::-1])}
+                if brick.any():
+                    name = f"{x // brick_size}_{y // brick_size}_{z // brick_size}.raw"
+                    brick.tofile(os.path.join(directory, name))
+                    entry["uri"] = f"{os.path.basename(directory)}/{name}"
+                bricks.append(entry)
+    return bricks
+
+def export_bricks(image, output_dir, value_range=None, dtype="uint16", brick_size=DEFAULT_BRICK_SIZE,
+                  max_size=DEFAULT_MAX_SIZE, units=None):
+    """Write image's pyramid to output_dir/level<N>/ plus output_dir/volume.json
+
+    value_range (default: the image's min and max) is mapped onto the
+    dtype's range; the manifest records it so the viewer can express its
+    transfer function in image units. Levels are listed coarsest first.
+    """
+    if dtype not in BRICK_DTYPES:
+        raise ValueError(f"Unknown brick dtype {dtype!r}, expected one of {sorted(BRICK_DTYPES)}")
+    if image.GetDimension() != 3 or image.GetNumberOfComponentsPerPixel() != 1:
+        raise ValueError("Volume bricks need a 3D scalar image")
+    if value_range is None:
+        statistics = sitk.MinimumMaximumImageFilter()
+        statistics.Execute(image)
+        value_range = (statistics.GetMinimum(), statistics.GetMaximum())
+    value_range = [float(value) for value in value_range]
+    
+    os.makedirs(output_dir, exist_ok=True)
+    levels = []
+    for number, level in enumerate(build_pyramid(image, max_size)):
+        bricks = write_bricks(level, os.path.join(output_dir, f"level{number}"), value_range,
+                              BRICK_DTYPES[dtype], brick_size)
+        levels.append({
+            "level": number,
+            "size": list(level.GetSize()),
+            "spacing": list(level.GetSpacing()),
+            "index_to_physical": index_to_physical(level).ravel().tolist(),
+            "bricks": bricks,
+        })
+        log.info(f"   Level {number}: {level.GetSize()}, {sum('uri' in brick for brick in bricks)}/{len(bricks)} bricks")
+    
+    manifest = {
+        "dtype": dtype,
+        "brick_size": brick_size,
+        "value_range": value_range,
+        "units": units,
+        "levels": levels[::-1],
+    }
+    manifest_path = os.path.join(output_dir, "volume.json")
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
@@ -6,7 +6,15 @@ Shows brain tissue, vessels, etc. instead of just skull
 
 from med_pipeline_fixed import MedicalTo3D
 import os
-import SimpleITK as sitk
+
+# Intensity ranges in HU, in label order (later ranges win where they overlap).
+# Brain and vessels are the old brain-window thresholds (-100..300 HU window,
+# 0.2-0.7 and 0.7-1.0); skull is the old bone-window threshold (0.4 of -1000..4000).
+TISSUES = [
+    ("brain", -20, 180, [0.83, 0.65, 0.65]),
+    ("vessels", 180, 32767, [0.8, 0.2, 0.2]),
+    ("skull", 1000, 32767, [0.95, 0.95, 0.85]),
+]
 
 def create_brain_volume():
     print("🧠 Creating internal brain volume...")
@@ -20,45 +28,29 @@ def create_brain_volume():
         pipeline.load_dicom_series(dicom_path)
         
         print("⚙️ Preprocessing for brain tissue...")
-        # Different windowing for soft tissue (brain)
-        pipeline.preprocess_ct(window_min=-100, window_max=300)  # Brain window
-        
-        # Create multiple tissue layers
-        print("🧠 Segmenting brain tissue...")
-        
-        # Brain tissue (gray/white matter)
-        brain_threshold = sitk.BinaryThresholdImageFilter()
-        brain_threshold.SetLowerThreshold(0.2)
-        brain_threshold.SetUpperThreshold(0.7)
-        brain_threshold.SetInsideValue(1)
-        brain_threshold.SetOutsideValue(0)
-        brain_seg = brain_threshold.Execute(pipeline.image)
+        # Keep HU so bone and soft-tissue ranges can share one label map
+        pipeline.preprocess_ct(window_min=-100, window_max=300, native_hu=True)  # Brain window
         
-        # Generate brain mesh
-        pipeline.segmentation = brain_seg
-        pipeline.generate_mesh(smoothing_iterations=5)
-        pipeline.export_stl("outputs/brain_tissue.stl")
-        print("✅ Brain tissue model: outputs/brain_tissue.stl")
+        # Create all tissue layers in one pass
+        print("🧠 Segmenting brain tissue, vessels and skull...")
+        pipeline.segment_labels(TISSUES, hu=True)
+        pipeline.generate_label_meshes(smoothing_iterations=5)
         
-        # Vessels/contrast (if present)
-        vessel_threshold = sitk.BinaryThresholdImageFilter()
-        vessel_threshold.SetLowerThreshold(0.7)
-        vessel_threshold.SetUpperThreshold(1.0)
-        vessel_threshold.SetInsideValue(1)
-        vessel_threshold.SetOutsideValue(0)
-        vessel_seg = vessel_threshold.Execute(pipeline.image)
+        os.makedirs("outputs", exist_ok=True)
+        for name, path in pipeline.export_label_meshes("outputs/{name}.glb").items():
+            print(f"✅ {name} model: {path}")
         
-        pipeline.segmentation = vessel_seg
-        pipeline.generate_mesh(smoothing_iterations=3)
-        pipeline.export_stl("outputs/vessels.stl")
-        print("✅ Vessel model: outputs/vessels.stl")
+        # The scan itself in HU, for ray marching with an interactive transfer function
+        print("🌫️ Exporting volume bricks...")
+        pipeline.export_volume_bricks("outputs/volume", value_range=(-1024, 3071))
         
         print("\n🎉 Created multiple anatomical models!")
         print("📁 Check outputs/ folder for:")
-        print("   - brain_tissue.stl (gray/white matter)")
-        print("   - vessels.stl (bright structures)")
-        print("   - skull_model.stl (your original skull)")
-        
+        print("   - brain.glb (gray/white matter)")
+        print("   - vessels.glb (bright structures)")
+        print("   - skull.glb (bone)")
+        print("   - volume/volume.json (ray-marched in the viewer: 🌫️ Volume Rendering)")
+    
     except Exception as e:
         print(f"❌ Error: {str(e)}")
 
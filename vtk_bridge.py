@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+SimpleITK ↔ VTK bridge shared by the pipeline modules
+Wraps SimpleITK pixel buffers as VTK arrays without copying
+"""
+
+import SimpleITK as sitk
+import numpy as np
+
+def sitk_to_vtk(sitk_image, mask=False):
+    """Wrap a SimpleITK image as vtkImageData sharing the same pixel buffer.
+
+    The VTK scalars are a shallow view of the SimpleITK buffer; the image is
+    attached to the VTK array so it stays alive as long as the array does.
+    With mask=True the image is first cast to uint8 unless it already is.
+    
+    The direction matrix is not applied here: the VTK image is axis-aligned
+    at the SimpleITK origin, and meshes extracted from it are rotated into
+    place by apply_direction().
+    """
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkCommonDataModel import vtkImageData
+    
+    if mask and sitk_image.GetPixelID() != sitk.sitkUInt8:
+        sitk_image = sitk.Cast(sitk_image, sitk.sitkUInt8)
+    
+    array = sitk.GetArrayViewFromImage(sitk_image)
+    vtk_array = numpy_support.numpy_to_vtk(array.reshape(-1), deep=False)
+    vtk_array._sitk_image = sitk_image
+    
+    vtk_image = vtkImageData()
+    vtk_image.SetDimensions(sitk_image.GetSize())
+    vtk_image.SetSpacing(sitk_image.GetSpacing())
+    vtk_image.SetOrigin(sitk_image.GetOrigin())
+    vtk_image.GetPointData().SetScalars(vtk_array)
+    
+    return vtk_image
+
+def direction_matrix(sitk_image):
+    dimension = sitk_image.GetDimension()
+    return np.array(sitk_image.GetDirection(), dtype=np.float64).reshape(dimension, dimension)
+
+def apply_direction(mesh, sitk_image):
+    """Rotate a mesh extracted by sitk_to_vtk() into the image's physical frame.
+
+    Points are rotated about the image origin in place (normals too, when
+    present). A mirroring direction matrix also reverses the triangle
+    winding so faces keep pointing outwards. Identity directions are a no-op.
+    """
+    from vtkmodules.util import numpy_support
+    
+    direction = direction_matrix(sitk_image)
+    if np.allclose(direction, np.eye(3)) or mesh.GetNumberOfPoints() == 0:
+        return mesh
+    
+    origin = np.array(sitk_image.GetOrigin())
+    points = numpy_support.vtk_to_numpy(mesh.GetPoints().GetData())
+    points[:] = (points - origin) @ direction.T + origin
+    mesh.GetPoints().Modified()
+    
+    normals = mesh.GetPointData().GetNormals()
+    if normals is not None:
+        normals = numpy_support.vtk_to_numpy(normals)
+        normals[:] = normals @ direction.T
+    
+    if np.linalg.det(direction) < 0:
+        polys = mesh.GetPolys()
+        offsets = numpy_support.vtk_to_numpy(polys.GetOffsetsArray())
+        connectivity = numpy_support.vtk_to_numpy(polys.GetConnectivityArray())
+        if np.all(np.diff(offsets) == 3):
+            triangles = connectivity.reshape(-1, 3)
+            triangles[:, [1, 2]] = triangles[:, [2, 1]]
+            polys.Modified()
+    
+    return mesh